@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 from dateutil import parser
 from prettytable import PrettyTable
 from keywords import EMPTY_NAMESPACE, NO_NAMESPACES
+from models import take_list, ResourceQuota
+from label_index import LabelIndex
 
 
 class TcpApiParser:
@@ -33,6 +35,45 @@ class TcpApiParser:
         if row_answer.get("results")[0].get("data").get("kind") == "ResourceQuota":
             self.show_human_readable_namespace_list()
 
+    def prefix_columns(self, row, record=None):
+        """
+        Prepends the CONTEXT and NAMESPACE columns to a header or a row when listing
+        several contexts or all namespaces
+        """
+        prefix = []
+        if self.kwargs.get("contexts"):
+            prefix.append("CONTEXT" if record is None else record.context)
+        if self.kwargs.get("all_namespaces"):
+            prefix.append("NAMESPACE" if record is None else record.namespace)
+        return prefix + row
+
+    def get_records(self, data):
+        """
+        Records of the list items, only those labeled with the --deploy value when it is given.
+        The items are taken out of the response, the renderers only need the records
+        """
+        deploy = self.kwargs.get("deploy")
+        items = data.get("items") or []
+        if deploy and items:
+            matched = LabelIndex.from_items(items).with_value(deploy)
+            items[:] = [items[i] for i in sorted(matched)]
+        return take_list(data)
+
+    def new_table(self, columns):
+        """
+        Tables of lists print each row as it is added when the memory budget is exceeded
+        """
+        if self.kwargs.get("stream"):
+            return StreamTable(columns)
+        table = PrettyTable(columns)
+        table.align = "l"
+        return table
+
+    @staticmethod
+    def show(table):
+        if isinstance(table, PrettyTable):
+            print(table)
+
     def show_human_readable_pod(self):
         metadata = self.result.get("results")[0].get("data").get("metadata")
         containers = self.result.get("results")[0].get("data").get("spec").get("containers")
@@ -96,57 +137,43 @@ class TcpApiParser:
 
     def show_human_readable_pod_list(self):
         if self.result:
-            items = self.result.get("results")[0].get("data").get("items")
-            table = PrettyTable(["NAME", "READY", "STATUS", "RESTARTS", "AGE", "IP"])
-            table.align = "l"
-            items = sorted(items, key=lambda x: parser.parse(x.get("metadata")["creationTimestamp"]))
-            for i in items:
-                restarts = i.get("status").get("containerStatuses")
-                restarts_sum = 0
-                if restarts:
-                    for r in restarts:
-                        restarts_sum += r.get("restartCount")
-                    else:
-                        restarts_sum = None
-                ip = i.get("status").get("podIP")
-                status = i.get("status").get("phase")
-                name = i.get("metadata").get("name")
-                ready = "-/-"
-                time = get_datetime_diff(i.get("metadata").get("creationTimestamp"))
-                if not self.kwargs.get("deploy") or self.kwargs.get("deploy") in i.get("metadata").get("labels").values():
-                    table.add_row([name, ready, status, restarts_sum, time, ip])
-            print(table)
+            pods = self.get_records(self.result.get("results")[0].get("data"))
+            table = self.new_table(self.prefix_columns(["NAME", "READY", "STATUS", "RESTARTS", "AGE", "IP"]))
+            if not (self.kwargs.get("all_namespaces") or self.kwargs.get("contexts") or
+                    self.kwargs.get("keep_order")):
+                pods.sort(key=lambda x: x.created)
+            for pod in pods:
+                ready = "%s/%s" % (pod.ready, pod.containers_count)
+                table.add_row(self.prefix_columns([pod.name, ready, pod.phase, pod.restarts,
+                                                     get_datetime_diff(pod.created), pod.ip], pod))
+            self.show(table)
         else:
             print(EMPTY_NAMESPACE)
 
     def show_human_readable_deployment_list(self):
         if self.result:
-            items = self.result.get("results")[0].get("data").get("items")
-            table = PrettyTable(["NAME",  "PODS", "PODS ACTIVE",  "CPU",  "RAM", "AGE"])
-            table.align = "l"
-            items = sorted(items, key=lambda x: parser.parse(x.get("metadata")["creationTimestamp"]))
-            for i in items:
-                containers = i.get("spec").get("template").get("spec").get("containers")
-                name = i.get("metadata").get("name")
+            deployments = take_list(self.result.get("results")[0].get("data"))
+            table = self.new_table(self.prefix_columns(["NAME",  "PODS", "PODS ACTIVE",  "CPU",  "RAM", "AGE"]))
+            if not (self.kwargs.get("all_namespaces") or self.kwargs.get("contexts") or
+                    self.kwargs.get("keep_order")):
+                deployments.sort(key=lambda x: x.created)
+            for d in deployments:
                 cpu = 0
                 memory = 0
                 cpu_prefix = "m"
                 memory_prefix = "Mi"
-                pods_active = i.get("status").get("availableReplicas")
-                if not pods_active:
-                    pods_active = 0
-                if i.get("spec").get("replicas"):
-                        pods = i.get("spec").get("replicas")
-                        for c in containers:
-                            if "m" in c.get("resources").get("limits").get("cpu"):
-                                cpu += int(c.get("resources").get("limits").get("cpu")[:-1])
+                if d.replicas:
+                        pods = d.replicas
+                        for c in d.containers:
+                            if "m" in c.cpu:
+                                cpu += int(c.cpu[:-1])
                             else:
-                                cpu += int(c.get("resources").get("limits").get("cpu"))*1000
-                            memory_prefix = c.get("resources").get("limits").get("memory")[-2:]
+                                cpu += int(c.cpu)*1000
+                            memory_prefix = c.memory[-2:]
                             if memory_prefix == "Gi":
-                                memory += 1024*int(c.get("resources").get("limits").get("memory")[:-2])
+                                memory += 1024*int(c.memory[:-2])
                             else:
-                                memory += int(c.get("resources").get("limits").get("memory")[:-2])
+                                memory += int(c.memory[:-2])
                         cpu *= pods
                         memory *= pods
                 else:
@@ -154,9 +181,9 @@ class TcpApiParser:
                 cpu = str(cpu) + cpu_prefix
                 memory = str(memory) + memory_prefix
 
-                time = get_datetime_diff(i.get("metadata").get("creationTimestamp"))
-                table.add_row([name,  pods, pods_active, cpu,  memory, time])
-            print(table)
+                table.add_row(self.prefix_columns([d.name,  pods, d.available_replicas, cpu,  memory,
+                                                     get_datetime_diff(d.created)], d))
+            self.show(table)
         else:
             print(NO_NAMESPACES)
 
@@ -221,29 +248,20 @@ class TcpApiParser:
 
     def show_human_readable_service_list(self):
         if self.result:
-            items = self.result.get("results")[0].get("data").get("items")
-            table = PrettyTable(["NAME",  "CLUSTER-IP",  "EXTERNAL", "HOST", "PORT(S)", "AGE"])
-            table.align = "l"
-            items = sorted(items, key=lambda x: parser.parse(x.get("metadata")["creationTimestamp"]))
-            for i in items:
-                name = i.get("metadata").get("name")
-                is_external = i.get("metadata").get("labels").get("external")
-                cluster_ip = i.get("spec").get("clusterIP")
-                if i.get("spec").get("domainHosts") and is_external == "true":
-                    external_host = " ,\n".join(i.get("spec").get("domainHosts"))
+            services = self.get_records(self.result.get("results")[0].get("data"))
+            table = self.new_table(self.prefix_columns(["NAME",  "CLUSTER-IP",  "EXTERNAL", "HOST", "PORT(S)", "AGE"]))
+            if not (self.kwargs.get("all_namespaces") or self.kwargs.get("contexts") or
+                    self.kwargs.get("keep_order")):
+                services.sort(key=lambda x: x.created)
+            for svc in services:
+                if svc.domain_hosts and svc.is_external == "true":
+                    external_host = " ,\n".join(svc.domain_hosts)
                 else:
                     external_host = "--"
-                ports = i.get("spec").get("ports")
-                for p in range(len(ports)):
-                    if ports[p].get("port") == ports[p].get("targetPort"):
-                        ports[p] = ("%s/%s" % (ports[p].get("port"), ports[p].get("protocol")))
-                    else:
-                        ports[p] = ("%s:%s/%s" % (ports[p].get("port"), ports[p].get("targetPort"), ports[p].get("protocol")))
-                sum_ports = " ,\n".join(ports)
-                time = get_datetime_diff(i.get("metadata").get("creationTimestamp"))
-                if not self.kwargs.get("deploy") or self.kwargs.get("deploy") in i.get("metadata").get("labels").values():
-                    table.add_row([name,  cluster_ip, is_external, external_host, sum_ports, time])
-            print(table)
+                sum_ports = " ,\n".join(str(p) for p in svc.ports)
+                table.add_row(self.prefix_columns([svc.name,  svc.cluster_ip, svc.is_external, external_host,
+                                                     sum_ports, get_datetime_diff(svc.created)], svc))
+            self.show(table)
 
     def show_human_readable_service(self):
         if self.result:
@@ -294,23 +312,46 @@ class TcpApiParser:
     def show_human_readable_namespace_list(self):
         items = self.result.get("results")
         if items:
-            table = PrettyTable(["NAME", "HARD CPU", "HARD MEMORY", "USED CPU", "USED MEMORY", "AGE"])
-            table.align = "l"
-            items = sorted(items, key=lambda x: parser.parse(x.get("data").get("metadata").get("creationTimestamp")))
-            for i in items:
-                name = i.get("data").get("metadata").get("namespace")
-                hard = i.get("data").get("status").get("hard")
-                used = i.get("data").get("status").get("used")
-                time = get_datetime_diff(i.get("data").get("metadata").get("creationTimestamp"))
-                table.add_row([name, hard.get("limits.cpu"), hard.get("limits.memory"), used.get("limits.cpu"),
-                               used.get("limits.memory"), time])
-            print(table)
+            table = self.new_table(["NAME", "HARD CPU", "HARD MEMORY", "USED CPU", "USED MEMORY", "AGE"])
+            quotas = sorted((ResourceQuota(i.get("data")) for i in items), key=lambda x: x.created)
+            for q in quotas:
+                table.add_row([q.namespace, q.hard.get("limits.cpu"), q.hard.get("limits.memory"),
+                               q.used.get("limits.cpu"), q.used.get("limits.memory"), get_datetime_diff(q.created)])
+            self.show(table)
         else:
             print(EMPTY_NAMESPACE)
 
 
+class StreamTable:
+    """
+    Tab separated rows written right away, nothing is kept to compute column widths
+    """
+    def __init__(self, columns):
+        print("\t".join(columns))
+
+    @staticmethod
+    def add_row(row):
+        print("\t".join(str(cell).replace(" ,\n", ",") for cell in row))
+
+
+def show_groups(field, sums, groups, stream=False):
+    """
+    Table of --group-by results: the group value, item count and sums
+    """
+    columns = [field.upper(), "COUNT"] + ["SUM({})".format(f.upper()) for f in sums]
+    table = StreamTable(columns) if stream else PrettyTable(columns)
+    if not stream:
+        table.align = "l"
+    for key, count, totals in groups:
+        table.add_row([key, count] + ['{:g}'.format(total) for total in totals])
+    TcpApiParser.show(table)
+
+
 def get_datetime_diff(timestamp):
-    created_date = parser.parse(timestamp)
+    if isinstance(timestamp, datetime):
+        created_date = timestamp
+    else:
+        created_date = parser.parse(timestamp)
     created_date = created_date.replace(tzinfo=None)
     current_date = datetime.utcnow()
     t_delta = current_date - created_date
@@ -318,5 +359,5 @@ def get_datetime_diff(timestamp):
     diff = ((t_delta.year - 1, "Y"), (t_delta.month - 1, "M"),
             (t_delta.day - 1, "d"), (t_delta.hour, "h"),
             (t_delta.minute, "m"), (t_delta.second, "s"))
-    diff = tuple(filter(lambda x: x[0] > 0, diff))[0]
-    return str(diff[0]) + diff[1]
\ No newline at end of file
+    diff = tuple(filter(lambda x: x[0] > 0, diff)) or ((0, "s"),)
+    return str(diff[0][0]) + diff[0][1]
\ No newline at end of file
@@ -1,16 +1,98 @@
 import json
+import threading
 import requests
+from urllib3.exceptions import ConnectTimeoutError
 from config_json_handler import get_json_from_config
-
-config_json_data = get_json_from_config()
+from session_transport import get_session
+from compression import get_accept_encoding, compress_body, decode_content
+from rate_limit import get_limiter
+from manifest_diff import MERGE_PATCH_CONTENT_TYPE
+from endpoints import rank, mark_failed
+
+POOL_SIZE = 16
+
+# why a request failed in a way another endpoint may fix: the connection was never
+# made, or it broke after the request may have reached the server
+NOT_SENT, MAYBE_SENT = 'not sent', 'maybe sent'
+RETRY_AFTER_SEND_METHODS = ("GET",)
+
+_http = None
+_http_lock = threading.Lock()
+
+
+def get_http():
+    """
+    Shared session, keeps connections to the api alive between requests and worker threads
+    """
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            _http.mount('http://', adapter)
+            _http.mount('https://', adapter)
+        return _http
+
+
+def open_connection(server, timeout):
+    """
+    A HEAD through the shared session leaves a connected keep-alive connection in the pool
+    the following requests take, whatever the answer is
+    """
+    try:
+        get_http().head(server, timeout=timeout, allow_redirects=False)
+    except requests.exceptions.RequestException:
+        # best effort, the request opens its own connection
+        pass
 
 
 class ApiHandler:
-    def __init__(self, uuid_v4):
-        self.server = config_json_data.get("api_handler").get("server")
-        self.headers = config_json_data.get("api_handler").get("headers")
+    def __init__(self, uuid_v4, config=None):
+        config = (config or get_json_from_config()).get("api_handler")
+        self.primary_server = config.get("server")
+        self.servers = rank([self.primary_server] + list(config.get("servers") or []))
+        self.server = self.servers[0]
+        self.headers = dict(config.get("headers"))
         self.headers.update({"Channel": uuid_v4})
-        self.TIMEOUT = config_json_data.get("api_handler").get("TIMEOUT")
+        self.headers.setdefault("Accept-Encoding", get_accept_encoding())
+        self.TIMEOUT = config.get("TIMEOUT")
+        self.COMPRESS_REQUESTS = config.get("COMPRESS_REQUESTS", False)
+        self.limiter = get_limiter(self.server, config)
+
+    def request(self, url, method, json_to_send=None, content_type=None):
+        headers = dict(self.headers, **{"Content-Type": content_type}) if content_type else self.headers
+        while True:
+            server = self.server
+            result = make_request(url, headers, self.TIMEOUT, method, json_to_send, self.COMPRESS_REQUESTS,
+                                  self.limiter)
+            failure = result.pop('failure', None)
+            # a write that may have reached the server is never sent again, it could run twice
+            if failure is None or (failure == MAYBE_SENT and method not in RETRY_AFTER_SEND_METHODS) or \
+                    not self.failover(server):
+                return result
+            url = self.server + url[len(server):]
+
+    def warm_up(self):
+        """
+        Opens a pooled connection to the api in the background so the first request
+        does not pay for connect and tls handshake
+        """
+        if get_session():
+            return
+        threading.Thread(target=open_connection, args=(self.server, self.TIMEOUT), daemon=True).start()
+
+    def failover(self, server):
+        """
+        Moves requests to the next endpoint after server failed, returns False when none is left
+        """
+        mark_failed(server)
+        if server not in self.servers:
+            return True
+        index = self.servers.index(server)
+        if index + 1 >= len(self.servers):
+            return False
+        self.server = self.servers[index + 1]
+        return True
 
     def create(self, json_to_send, namespace=None):
         kind = '{}s'.format(json_to_send['kind'].lower())
@@ -27,12 +109,12 @@ class ApiHandler:
                 kind
             )
 
-        result = make_request(url, self.headers, self.TIMEOUT, "POST", json_to_send)
+        result = self.request(url, "POST", json_to_send)
         return result
 
     def login(self, json_to_send):
         url = '{}/session/login'.format(self.server)
-        result = make_request(url, self.headers, self.TIMEOUT, "POST", json_to_send)
+        result = self.request(url, "POST", json_to_send)
         return result
 
     def set(self, json_to_send, name, namespace=None):
@@ -60,7 +142,7 @@ class ApiHandler:
                     self.server,
                     name
                 )
-        result = make_request(url, self.headers, self.TIMEOUT, "PATCH", json_to_send)
+        result = self.request(url, "PATCH", json_to_send)
         return result
 
     def scale(self, json_to_send, name, namespace=None):
@@ -75,7 +157,7 @@ class ApiHandler:
                 self.server,
                 name
             )
-        result = make_request(url, self.headers, self.TIMEOUT, "PATCH", json_to_send)
+        result = self.request(url, "PATCH", json_to_send)
         return result
 
     def replace(self, json_to_send, namespace):
@@ -95,7 +177,21 @@ class ApiHandler:
             name
         )
 
-        result = make_request(url, self.headers, self.TIMEOUT, json_to_send, method="PUT")
+        result = self.request(url, "PUT", json_to_send)
+
+        return result
+
+    def patch(self, kind, name, namespace, json_to_send):
+        if not namespace:
+            namespace = 'default'
+        url = '{}/namespaces/{}/{}/{}'.format(
+            self.server,
+            namespace,
+            kind,
+            name
+        )
+
+        result = self.request(url, "PATCH", json_to_send, MERGE_PATCH_CONTENT_TYPE)
 
         return result
 
@@ -107,7 +203,7 @@ class ApiHandler:
             name
         )
 
-        result = make_request(url, self.headers, self.TIMEOUT, "PUT", json_to_send)
+        result = self.request(url, "PUT", json_to_send)
 
         return result
 
@@ -121,7 +217,7 @@ class ApiHandler:
             url = '{}/namespaces/default/deployments'.format(
                 self.server
             )
-        result = make_request(url, self.headers, self.TIMEOUT, "POST", json_to_send)
+        result = self.request(url, "POST", json_to_send)
 
         return result
 
@@ -136,7 +232,7 @@ class ApiHandler:
                 self.server
             )
 
-        result = make_request(url, self.headers, self.TIMEOUT, "POST", json_to_send)
+        result = self.request(url, "POST", json_to_send)
 
         return result
 
@@ -157,7 +253,7 @@ class ApiHandler:
                 kind,
                 name
             )
-        result = make_request(url, self.headers, self.TIMEOUT, "DELETE")
+        result = self.request(url, "DELETE")
 
         return result
 
@@ -167,11 +263,11 @@ class ApiHandler:
             name
         )
 
-        result = make_request(url, self.headers, self.TIMEOUT, "DELETE")
+        result = self.request(url, "DELETE")
 
         return result
 
-    def get(self, kind, name, namespace):
+    def get(self, kind, name, namespace, resource_version=None):
         if name:
             url = '{}/namespaces/{}/{}/{}'.format(
                 self.server,
@@ -185,7 +281,31 @@ class ApiHandler:
                 namespace,
                 kind
             )
-        result = make_request(url, self.headers, self.TIMEOUT, "GET")
+            if resource_version:
+                url = '{}?resourceVersion={}'.format(url, resource_version)
+        result = self.request(url, "GET")
+        return result
+
+    def logs(self, name, namespace, container=None, follow=False, since=None, tail=None):
+        if not namespace:
+            namespace = 'default'
+        url = '{}/namespaces/{}/pods/{}/log'.format(
+            self.server,
+            namespace,
+            name
+        )
+        params = {}
+        if container:
+            params['container'] = container
+        if follow:
+            params['follow'] = 'true'
+        if since:
+            params['sinceSeconds'] = since
+        if tail is not None:
+            params['tailLines'] = tail
+        timeout = (self.TIMEOUT, None) if follow else self.TIMEOUT
+        result = make_stream_request(url, self.headers, timeout, params)
+
         return result
 
     def get_namespaces(self, name=None):
@@ -199,17 +319,34 @@ class ApiHandler:
                 self.server
             )
 
-        result = make_request(url, self.headers, self.TIMEOUT, "GET")
+        result = self.request(url, "GET")
 
         return result
 
 
+def is_connect_error(e):
+    """
+    True when the connection was refused, not resolved or timed out, the request was never sent
+    """
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = e.args[0] if isinstance(e, requests.exceptions.ConnectionError) and e.args else None
+    # requests wraps the urllib3 error in MaxRetryError
+    return isinstance(getattr(reason, 'reason', reason), ConnectTimeoutError)
+
+
 def request_exceptions_decorate(func):
     def func_wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if is_connect_error(e):
+                return {'error': 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection error',
+                        'failure': NOT_SENT}
+            print(e)
+            return {'error': 'connection error', 'failure': MAYBE_SENT}
         except requests.exceptions.Timeout:
-            return {'error': 'timeout'}
+            return {'error': 'timeout', 'failure': MAYBE_SENT}
         except json.decoder.JSONDecodeError as e:
             return {'error': str(e)}
         except StatusException as e:
@@ -222,44 +359,67 @@ def request_exceptions_decorate(func):
 
 
 @request_exceptions_decorate
-def make_request(url, headers, timeout, method, json_to_send=None):
+def make_request(url, headers, timeout, method, json_to_send=None, compress=False, limiter=None):
+    session = get_session()
+    started = limiter.acquire() if limiter else None
+    status_code = None
+    try:
+        if session:
+            status_code, content = session.send_request(send_request, url, headers, timeout, method, json_to_send,
+                                                        compress)
+        else:
+            status_code, content = send_request(url, headers, timeout, method, json_to_send, compress)
+    finally:
+        if limiter:
+            limiter.release(started, status_code, (method, url.partition('?')[0]))
+    if status_code == 200:
+        return json.loads(content.decode('utf-8'))
+    else:
+        raise StatusException(status_code, content)
+
+
+def send_request(url, headers, timeout, method, json_to_send=None, compress=False):
     if method == "DELETE":
-        r = requests.delete(
+        r = get_http().delete(
             url,
             headers=headers,
             timeout=timeout
         )
-    elif method == "POST":
-        r = requests.post(
-            url,
-            data=json.dumps(json_to_send),
-            timeout=timeout,
-            headers=headers
-        )
-    elif method == "PUT":
-        r = requests.put(
-            url,
-            data=json.dumps(json_to_send),
-            timeout=timeout,
-            headers=headers
-        )
-    elif method == "PATCH":
-        r = requests.patch(
+    elif method in ("POST", "PUT", "PATCH"):
+        data = json.dumps(json_to_send).encode('utf-8')
+        if compress:
+            data, content_encoding = compress_body(data)
+            if content_encoding:
+                headers = dict(headers, **{"Content-Encoding": content_encoding})
+        r = get_http().request(
+            method,
             url,
-            data=json.dumps(json_to_send),
+            data=data,
             timeout=timeout,
             headers=headers
         )
     else:
-        r = requests.get(
+        r = get_http().get(
             url,
             headers=headers,
             timeout=timeout
         )
+    return r.status_code, decode_content(r.content, r.headers.get("Content-Encoding"))
+
+
+@request_exceptions_decorate
+def make_stream_request(url, headers, timeout, params=None):
+    r = get_http().get(
+        url,
+        headers=dict(headers, **{"Accept-Encoding": "gzip, deflate"}),
+        params=params,
+        timeout=timeout,
+        stream=True
+    )
     if r.status_code == 200:
-        return json.loads(r.text)
+        return r
     else:
-        raise StatusException(r.status_code, r._content)
+        raise StatusException(r.status_code, r.content)
 
 
 class StatusException(Exception):
@@ -0,0 +1,72 @@
+import copy
+import json
+import os
+import os.path
+import yaml
+
+EXPORT_KINDS = ("deployments", "services")
+IMPORT_ORDER = ("deployments", "services")
+QUOTA_FILE = "quota.yaml"
+MANIFEST_EXTENSIONS = (".yaml", ".yml", ".json")
+
+SERVER_METADATA_FIELDS = ("namespace", "uid", "resourceVersion", "selfLink", "creationTimestamp", "generation",
+                          "deletionTimestamp", "ownerReferences")
+
+NO_MANIFESTS_ERROR = "no manifests in {}"
+
+
+def normalize(item, kind):
+    """
+    Returns a copy of a listed object without fields the server populates,
+    ready to be created again in any namespace
+    """
+    item = copy.deepcopy(item)
+    item["kind"] = item.get("kind") or kind[:-1].capitalize()
+    metadata = item.setdefault("metadata", {})
+    for field in SERVER_METADATA_FIELDS:
+        metadata.pop(field, None)
+    item.pop("status", None)
+    spec = item.get("spec") or {}
+    if kind == "services":
+        spec.pop("clusterIP", None)
+        spec.pop("domainHosts", None)
+    template_metadata = (spec.get("template") or {}).get("metadata")
+    if template_metadata:
+        template_metadata.pop("creationTimestamp", None)
+    return item
+
+
+def write_manifest(directory, kind, item):
+    kind_directory = os.path.join(directory, kind)
+    os.makedirs(kind_directory, exist_ok=True)
+    file_name = os.path.join(kind_directory, '{}.yaml'.format(item["metadata"]["name"]))
+    with open(file_name, 'w', encoding='utf-8') as w:
+        yaml.safe_dump(item, w, default_flow_style=False)
+    return file_name
+
+
+def write_quota(directory, quota):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, QUOTA_FILE), 'w', encoding='utf-8') as w:
+        yaml.safe_dump({"hard": (quota.get("status") or {}).get("hard") or {}}, w, default_flow_style=False)
+
+
+def load_manifest(file_name):
+    with open(file_name, 'r', encoding='utf-8') as f:
+        if file_name.endswith(".json"):
+            return json.load(f)
+        return yaml.safe_load(f)
+
+
+def read_manifests(directory):
+    """
+    Yields (kind, file name) of exported manifests in dependency order:
+    deployments first, so services find their pods
+    """
+    for kind in IMPORT_ORDER:
+        kind_directory = os.path.join(directory, kind)
+        if not os.path.isdir(kind_directory):
+            continue
+        for file_name in sorted(os.listdir(kind_directory)):
+            if file_name.endswith(MANIFEST_EXTENSIONS):
+                yield kind, os.path.join(kind_directory, file_name)
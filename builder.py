@@ -1,10 +1,174 @@
-from cx_Freeze import Executable,setup
+"""
+Builds chkit for distribution.
 
-setup(
-    packages=['queue'],
-    name="chkit",
-    description="Containerum Hosting Client",
-    version="1.2.2",
-    executables=[Executable("chkit.py")]
-)
+    python builder.py build_exe -p queue     frozen binary with cx_Freeze
+    python builder.py zipapp [--output FILE] [--python INTERPRETER] [--import-budget MS]
 
+The zipapp is one file with precompiled bytecode of chkit and every pure python module it imports,
+runnable by the python version that built it. The build fails when importing the client from it
+takes longer than the import budget.
+"""
+import argparse
+import io
+import importlib.util
+import marshal
+import os
+import os.path
+import re
+import subprocess
+import sys
+import sysconfig
+import time
+import zipfile
+from modulefinder import ModuleFinder
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINT = "chkit.py"
+DEFAULT_OUTPUT = os.path.join("dist", "chkit.pyz")
+DEFAULT_INTERPRETER = "/usr/bin/env python{}.{}".format(*sys.version_info[:2])
+IMPORT_BUDGET = 400
+BUDGET_RUNS = 5
+
+# modules only the build, tests or other entry points use, never shipped
+EXCLUDE = ["builder", "setup", "sdk", "cx_Freeze", "py2app", "distutils", "setuptools", "pip", "pkg_resources",
+           "_distutils_hack", "tkinter", "unittest", "pydoc", "doctest", "lib2to3", "IPython"]
+
+MAIN = """import chkit
+
+chkit.main()
+"""
+
+
+def get_version():
+    with open(os.path.join(ROOT, ENTRY_POINT), 'r', encoding='utf-8') as f:
+        return re.search(r'^VERSION = "(.+)"', f.read(), re.M).group(1)
+
+
+def find_modules():
+    """
+    Returns {module name: file} of chkit modules and third party pure python modules
+    reachable from the entry point, standard library and extension modules are left out
+    (site-packages may live inside the standard library directory, so only it is checked)
+    """
+    finder = ModuleFinder(path=[ROOT] + sys.path, excludes=EXCLUDE)
+    finder.run_script(os.path.join(ROOT, ENTRY_POINT))
+    site_packages = {os.path.realpath(sysconfig.get_paths()[p]) for p in ("purelib", "platlib")}
+    modules = {}
+    for name, module in finder.modules.items():
+        file_name = module.__file__
+        if not file_name:
+            continue
+        if not file_name.endswith(".py"):
+            # packages like charset_normalizer ship the same module as source next to the compiled one
+            file_name = os.path.join(os.path.dirname(file_name), os.path.basename(file_name).split('.')[0] + ".py")
+            if not os.path.isfile(file_name):
+                continue
+        if name == "__main__":
+            name = os.path.splitext(ENTRY_POINT)[0]
+        real = os.path.realpath(file_name)
+        if os.path.dirname(real) == ROOT or any(real.startswith(p + os.sep) for p in site_packages):
+            modules[name] = real
+    return modules
+
+
+def find_data_files(modules):
+    """
+    Non python files of bundled packages (certificates, typing markers), read through importlib.resources
+    """
+    data_files = {}
+    for name, file_name in modules.items():
+        if os.path.basename(file_name) != "__init__.py":
+            continue
+        package_dir = os.path.dirname(file_name)
+        for entry in os.listdir(package_dir):
+            path = os.path.join(package_dir, entry)
+            if os.path.isfile(path) and not entry.endswith((".py", ".pyc", ".so", ".pyd", ".pyi")):
+                data_files['{}/{}'.format(name.replace('.', '/'), entry)] = path
+    return data_files
+
+
+def get_archive_name(name, file_name):
+    base = name.replace('.', '/')
+    return base + "/__init__.pyc" if os.path.basename(file_name) == "__init__.py" else base + ".pyc"
+
+
+def compile_module(file_name, archive_name):
+    """
+    Sourceless bytecode next to where the source would be, the layout zipimport looks for
+    """
+    with open(file_name, 'rb') as f:
+        source = f.read()
+    code = compile(source, archive_name[:-1], 'exec', dont_inherit=True)
+    # flags 1: hash based pyc that is never checked against a source
+    return importlib.util.MAGIC_NUMBER + (1).to_bytes(4, 'little') + \
+        importlib.util.source_hash(source) + marshal.dumps(code)
+
+
+def build_zipapp(output, interpreter):
+    modules = find_modules()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("__main__.py", MAIN)
+        for name, file_name in sorted(modules.items()):
+            archive_name = get_archive_name(name, file_name)
+            archive.writestr(archive_name, compile_module(file_name, archive_name))
+        for archive_name, file_name in sorted(find_data_files(modules).items()):
+            archive.write(file_name, archive_name)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'wb') as w:
+        w.write('#!{}\n'.format(interpreter).encode('utf-8'))
+        w.write(buffer.getvalue())
+    os.chmod(output, 0o755)
+    return modules
+
+
+def measure_import(output):
+    """
+    Best of BUDGET_RUNS wall times in ms of importing the client from the zipapp,
+    minus the time of starting the interpreter alone
+    """
+    def best(code):
+        times = []
+        for _ in range(BUDGET_RUNS):
+            started = time.monotonic()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(output)))
+            times.append(time.monotonic() - started)
+        return min(times)
+    path = os.path.abspath(output)
+    return (best("import sys; sys.path.insert(0, {!r}); import client".format(path)) - best("pass")) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a single file chkit zipapp")
+    parser.add_argument("target", choices=["zipapp"])
+    parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT)
+    parser.add_argument("--python", default=DEFAULT_INTERPRETER, help="interpreter of the shebang line")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET, metavar="MS",
+                        help="fail when importing the client takes longer, 0 disables the check")
+    args = parser.parse_args()
+
+    modules = build_zipapp(args.output, args.python)
+    print("{}: chkit {}, {} modules, {} KiB".format(args.output, get_version(), len(modules),
+                                                   os.path.getsize(args.output) // 1024))
+    subprocess.run([sys.executable, args.output, "--version"], check=True)
+    if args.import_budget:
+        import_time = measure_import(args.output)
+        print("client import time {:.0f}ms, budget {:.0f}ms".format(import_time, args.import_budget))
+        if import_time > args.import_budget:
+            sys.exit("import time over budget, look for new imports with: "
+                     "python -X importtime {} --version".format(args.output))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "zipapp":
+        main()
+    else:
+        from cx_Freeze import Executable, setup
+
+        setup(
+            packages=['queue'],
+            name="chkit",
+            description="Containerum Hosting Client",
+            version=get_version(),
+            executables=[Executable(ENTRY_POINT)]
+        )
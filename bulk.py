@@ -0,0 +1,77 @@
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from label_index import LabelIndex, parse_selector
+
+MAX_WORKERS = 8
+
+REPLICAS_TARGET_REGEX = re.compile(
+    r"^(?:(?P<sign>[+-])(?P<delta>\d+)|x(?P<factor>\d+(?:\.\d+)?)|(?P<percent>\d+(?:\.\d+)?)%|(?P<count>\d+))$"
+)
+
+REPLICAS_TARGET_ERROR = "Count must be N, +N, -N, xN or N%"
+REPLICAS_MIN_ERROR = "Count must be positive integer"
+NO_TARGETS_ERROR = "No deployments matched"
+
+
+def parse_replicas_target(target):
+    match = REPLICAS_TARGET_REGEX.match(str(target).strip())
+    if not match:
+        raise ValueError(REPLICAS_TARGET_ERROR)
+    if match.group("count") is not None:
+        count = int(match.group("count"))
+        if count < 1:
+            raise ValueError(REPLICAS_MIN_ERROR)
+    return match.groupdict()
+
+
+def is_relative_target(target):
+    return parse_replicas_target(target).get("count") is None
+
+
+def resolve_replicas(target, current):
+    """
+    Turns an absolute or relative replicas target (5, +2, -1, x2, 50%)
+    into a replicas count for a deployment that currently has current replicas
+    """
+    parsed = parse_replicas_target(target)
+    current = current or 0
+    if parsed.get("count") is not None:
+        return int(parsed["count"])
+    if parsed.get("sign"):
+        delta = int(parsed["delta"])
+        result = current + delta if parsed["sign"] == "+" else current - delta
+    elif parsed.get("factor"):
+        result = math.ceil(current * float(parsed["factor"]))
+    else:
+        result = math.ceil(current * float(parsed["percent"]) / 100)
+    return max(result, 1)
+
+
+def select_items(items, names=None, selector=None):
+    """
+    Picks list items by explicit names and/or a label selector (see label_index.parse_selector),
+    the selector is answered by a label index so only matching items are visited afterwards
+    """
+    if selector:
+        index = LabelIndex.from_items(items)
+        items = [items[i] for i in sorted(index.select(parse_selector(selector)))]
+    if names:
+        names = set(names)
+        items = [i for i in items if (i.get("metadata") or {}).get("name") in names]
+    return items
+
+
+def fan_out(func, jobs, workers=MAX_WORKERS):
+    """
+    Calls func(job) for every job with at most workers calls in flight,
+    returns results in the order of jobs
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    workers = max(1, min(workers or MAX_WORKERS, len(jobs)))
+    if workers == 1:
+        return [func(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, jobs))
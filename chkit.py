@@ -1,12 +1,23 @@
 #!/usr/bin/python3
-from client import Client
+import os
+import sys
 
 VERSION = "1.3.4"
 
 
 def main():
+    if sys.argv[1:] == ["--version"]:
+        # answered before importing anything, it is what health checks of ci images run
+        print("chkit {}".format(VERSION))
+        return
+    if "_ARGCOMPLETE" in os.environ:
+        # shell completion only needs the parser, skip importing api and tcp handlers
+        from parser import create_parser
+        create_parser(VERSION)
+    from client import Client
     client = Client(VERSION)
-    client.go()
+    code = client.go()
+    sys.exit(code if isinstance(code, int) else 0)
 
 
 if __name__ == '__main__':
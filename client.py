@@ -1,24 +1,46 @@
 import os
+import sys
+import atexit
+import copy
 import json
 import yaml
 import re
-from data import deployment_json, service_json
+from manifests import build_deployment, build_matrix, build_expose, parse_service_port
 from parser import *
 from tcp_handler import TcpHandler, check_http_status
 from api_handler import ApiHandler
 from bcolors import BColors
 from getpass import getpass
-from config_json_handler import get_json_from_config, set_token_to_json_config,set_default_namespace_to_json_config,\
+from config_json_handler import get_json_from_config, get_context_config, add_context_to_json_config, \
+    set_current_context_to_json_config, set_token_to_json_config,set_default_namespace_to_json_config,\
     show_namespace_token_from_config
-from answer_parsers import TcpApiParser
+from answer_parsers import TcpApiParser, show_groups
+from models import merge_by_created
+from manifest_diff import merge_patch, format_changes
+from backup import EXPORT_KINDS, IMPORT_ORDER, NO_MANIFESTS_ERROR, normalize, write_manifest, write_quota, \
+    load_manifest, read_manifests
 import uuid
-from keywords import JSON_TEMPLATES_RUN_FILE, LOWER_CASE_ERROR, NO_IMAGE_AND_CONFIGURE_ERROR, JSON_TEMPLATES_EXPOSE_FILE
+from keywords import JSON_TEMPLATES_RUN_FILE, LOWER_CASE_ERROR, NO_IMAGE_AND_CONFIGURE_ERROR, JSON_TEMPLATES_EXPOSE_FILE, \
+    NO_PODS_ERROR
 from run_configure import RunConfigure
+from completion_index import update_index
+from rate_limit import get_limiters
+from list_cache import ListCache, is_expired, clear_cache
+from query import Query
+from label_index import LabelIndex, parse_selector
+import session_transport
+import memstats
+from memstats import phase, over_budget, parse_size, SIZE_ERROR
+from logs import parse_since, write_stream, write_merged_streams
+from wait import parse_target, parse_condition, wait_for, EXIT_ERROR
+from rolling_restart import RollingRestart, Budget, parse_wave
+from bulk import fan_out, parse_replicas_target, is_relative_target, resolve_replicas, select_items, \
+    NO_TARGETS_ERROR
 from datetime import datetime
-from hashlib import sha256, md5
+from hashlib import md5
 
-
-config_json_data = get_json_from_config()
+PIPELINED_COMMANDS = ('run', 'create', 'get', 'delete', 'replace', 'apply', 'diff', 'expose', 'set', 'restart',
+                      'scale', 'wait', 'export', 'import')
 
 
 class Client:
@@ -26,15 +48,93 @@ class Client:
         self.path = os.getcwd()
         self.version = version
         self.parser = create_parser(self.version)
-        uuid_v4 = str(uuid.uuid4())
         self.args = vars(self.parser.parse_args())
         self.debug = self.args.get("debug")
-        self.tcp_handler = TcpHandler(uuid_v4, self.args.get("debug"))
-        self.api_handler = ApiHandler(uuid_v4)
+        self.start_session()
+        self.start_memstats()
+        self.base_config = get_json_from_config()
+        self.context_name = self.base_config.get("current_context")
+        if self.context_name in (self.base_config.get("contexts") or {}):
+            self.use_config(get_context_config(self.base_config, self.context_name))
+        else:
+            self.context_name = None
+            self.use_config(self.base_config)
+        self.command_id = None
+        self.query = None
+        if self.debug:
+            atexit.register(self.print_limits)
+
+    def use_config(self, config):
+        uuid_v4 = str(uuid.uuid4())
+        self.config = config
+        self.tcp_handler = TcpHandler(uuid_v4, self.debug, self.config)
+        self.api_handler = ApiHandler(uuid_v4, self.config)
+        self.list_cache = None
+        if not (self.args.get("record") or self.args.get("replay")):
+            self.list_cache = ListCache(self.api_handler.primary_server,
+                                        self.api_handler.headers.get("Authorization"))
+
+    def for_context(self, name):
+        """
+        Returns a copy of the client talking to context name over its own channel
+        """
+        client = copy.copy(self)
+        client.args = dict(self.args)
+        client.context_name = name
+        client.use_config(get_context_config(self.base_config, name))
+        return client
+
+    def get_contexts(self):
+        available = self.base_config.get("contexts") or {}
+        if self.args.get("all_contexts"):
+            names = sorted(available)
+        else:
+            names = [n.strip() for n in (self.args.get("context") or "").split(",") if n.strip()]
+        for name in names:
+            if name not in available:
+                self.parser.error('no such context: {}'.format(name))
+        return names
+
+    @staticmethod
+    def print_limits():
+        for server, limiter in get_limiters().items():
+            if limiter.requests:
+                print('{}{}: {}{}'.format(BColors.OKBLUE, server, limiter, BColors.ENDC))
+
+    def start_session(self):
+        if self.args.get("record") and self.args.get("replay"):
+            self.parser.error(RECORD_OR_REPLAY_ERROR)
+        if self.args.get("record"):
+            session_transport.start_recording(os.path.join(self.path, self.args.get("record")))
+            atexit.register(session_transport.stop)
+        elif self.args.get("replay"):
+            file_name = os.path.join(self.path, self.args.get("replay"))
+            if not os.path.isfile(file_name):
+                self.parser.error('no such file: {}'.format(file_name))
+            session_transport.start_replay(file_name, self.args.get("replay_speed"))
+
+    def start_memstats(self):
+        self.memory_budget = None
+        if self.args.get("memory_budget"):
+            try:
+                self.memory_budget = parse_size(self.args.get("memory_budget"))
+            except ValueError:
+                self.parser.error(SIZE_ERROR)
+        if self.args.get("memstats"):
+            if not memstats.is_supported():
+                self.parser.error(memstats.VERSION_ERROR)
+            atexit.register(memstats.start().report)
 
     def go_config(self):
             if self.args.get("set_token"):
                 set_token_to_json_config(self.args.get("set_token"))
+            elif self.args.get("add_context"):
+                if not (self.args.get("server") and self.args.get("tcp_address")):
+                    self.parser.error(ADD_CONTEXT_ERROR)
+                add_context_to_json_config(self.args.get("add_context"), self.args.get("server"),
+                                           self.args.get("tcp_address"), self.args.get("token"))
+            elif self.args.get("use_context") is not None:
+                set_current_context_to_json_config(self.args.get("use_context"))
             elif self.args.get("set_default_namespace"):
                 if not self.test_namespace(self.args.get("set_default_namespace")):
                     return
@@ -45,6 +145,7 @@ class Client:
     @staticmethod
     def logout():
         set_token_to_json_config("")
+        clear_cache()
         print("Bye!")
 
     def login(self):
@@ -89,6 +190,17 @@ class Client:
         else:
             self.args["kind"] = "namespaces"
 
+        if self.args['command'] == 'get':
+            self.query = self.get_query()
+
+        contexts = self.get_contexts()
+        if len(contexts) == 1:
+            self.context_name = contexts[0]
+            self.use_config(get_context_config(self.base_config, contexts[0]))
+        elif contexts:
+            return self.go_contexts(contexts)
+        self.start_connections()
+
         if self.args['command'] == 'run':
             self.go_run()
 
@@ -104,6 +216,12 @@ class Client:
         elif self.args['command'] == 'replace':
             self.go_replace()
 
+        elif self.args['command'] == 'apply':
+            self.go_apply()
+
+        elif self.args['command'] == 'diff':
+            return self.go_diff()
+
         elif self.args['command'] == 'config':
             self.go_config()
 
@@ -125,98 +243,349 @@ class Client:
         elif self.args['command'] == 'scale':
             self.go_scale()
 
+        elif self.args['command'] == 'logs':
+            self.go_logs()
+
+        elif self.args['command'] == 'wait':
+            return self.go_wait()
+
+        elif self.args['command'] == 'export':
+            self.go_export()
+
+        elif self.args['command'] == 'import':
+            self.go_import()
+
+    def get_query(self):
+        if not (self.args.get("where") or self.args.get("sort_by") or self.args.get("group_by")):
+            if self.args.get("sum"):
+                self.parser.error(SUM_WITHOUT_GROUP_ERROR)
+            return None
+        try:
+            return Query(self.args.get("where"), self.args.get("sort_by"), self.args.get("group_by"),
+                         self.args.get("sum"))
+        except ValueError as e:
+            self.parser.error(str(e))
+
+    def start_connections(self):
+        """
+        Opens the tcp channel and an api connection while the command builds its request,
+        tcp_connect() then only waits for the channel to be authorized
+        """
+        if self.args.get("command") not in PIPELINED_COMMANDS:
+            return
+        self.tcp_handler.start_connect()
+        self.api_handler.warm_up()
+
+    def go_contexts(self, names):
+        """
+        Runs get, scale or set against several contexts concurrently, get output is merged
+        into one table with a CONTEXT column
+        """
+        if self.args['command'] not in ('get', 'scale', 'set'):
+            self.parser.error(CONTEXT_COMMANDS_ERROR)
+        clients = [self.for_context(name) for name in names]
+        if self.args['command'] == 'get':
+            self.go_get_contexts(clients)
+        elif self.args['command'] == 'scale':
+            fan_out(lambda client: client.go_scale(), clients, len(clients))
+        else:
+            fan_out(lambda client: client.go_set(), clients, len(clients))
+
+    def go_get_contexts(self, clients):
+        kind, name = self.construct_get()
+        if name or kind == "namespaces":
+            self.parser.error(CONTEXT_COMMANDS_ERROR)
+        if self.debug:
+            self.log_time()
+        results = fan_out(lambda client: client.get_context_items(kind), clients, len(clients))
+        item_lists = []
+        data = None
+        for client, result in zip(clients, results):
+            if not result:
+                continue
+            data = result.get("results")[0].get("data")
+            for item in data.get("items") or []:
+                item["context"] = client.context_name
+            item_lists.append(data.get("items") or [])
+        if data is None:
+            return
+        with phase("transform"):
+            json_result = {"results": [{"data": dict(data, metadata={}, items=merge_by_created(item_lists))}]}
+        # the merged result is left the only holder of the items, the renderer frees them as it goes
+        del results, item_lists, data
+        self.print_result(json_result, contexts=True)
+
+    def get_context_items(self, kind):
+        self.tcp_connect()
+        if self.args.get("all_namespaces"):
+            result = self.get_all_namespaces(kind)
+        else:
+            namespace = self.args.get('namespace') or self.config.get("default_namespace")
+            result = self.get_list(kind, namespace, self.args.get("relist"), forget=True)
+            if result.get("error"):
+                self.print_error(result.get("error"))
+                result = None
+            elif result:
+                self.update_completion_index(kind, namespace, result)
+        self.tcp_handler.close()
+        return result
+
     def go_restart(self):
         self.log_time()
-        self.tcp_connect()
 
         namespace = self.args['namespace']
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
-        api_result = self.api_handler.delete("deployments", self.args["name"], namespace, True)
-        if not self.handle_api_result(api_result):
+            namespace = self.config.get("default_namespace")
+
+        if self.args.get("all_pods"):
+            self.tcp_connect()
+            results = fan_out(lambda name: self.execute(self.api_handler.delete, "deployments", name, namespace, True),
+                              self.args["name"], self.args.get("parallel"))
+            self.tcp_handler.close()
+            self.print_bulk_results('restart', self.args["name"], results)
             return
 
-        json_result = self.get_and_handle_tcp_result('restart')
-        self.tcp_handler.close()
-        if not check_http_status(json_result, self.args.get("command")):
+        try:
+            parse_wave(self.args.get("wave"))
+        except ValueError as e:
+            self.print_error(e)
             return
 
+        self.tcp_connect()
+        restart = RollingRestart(self.execute, self.api_handler, namespace,
+                                 wave=self.args.get("wave"),
+                                 budget=Budget(self.args.get("budget")),
+                                 timeout=self.args.get("timeout"),
+                                 debug=self.debug)
+        results = fan_out(restart.restart, self.args["name"], self.args.get("parallel"))
+        self.tcp_handler.close()
+        self.print_bulk_results('restart', self.args["name"], results)
+
     def go_scale(self):
         if self.args.get("debug"):
             self.log_time()
-        self.tcp_connect()
 
         namespace = self.args.get('namespace')
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
+            namespace = self.config.get("default_namespace")
 
         count = self.args.get("count")
         try:
-            replicas_count = int(count)
-            json_to_send = {"replicas": replicas_count}
-            api_result = self.api_handler.scale(json_to_send, self.args.get("name"), namespace)
-        except (ValueError, TypeError):
-            print('{}{}{} {}'.format(
-                BColors.FAIL,
-                "Error: ",
-                "Count is not integer",
-                BColors.ENDC,
-            ))
+            parse_replicas_target(count)
+            parse_selector(self.args.get("selector"))
+        except ValueError as e:
+            self.print_error(e)
             return
-        if not self.handle_api_result(api_result):
+
+        self.tcp_connect()
+        jobs = self.resolve_deployments(namespace, self.args.get("name"), self.args.get("selector"),
+                                        need_spec=is_relative_target(count))
+        if jobs is None:
+            self.tcp_handler.close()
             return
 
-        json_result = self.get_and_handle_tcp_result('scale')
+        jobs = [(name, {"replicas": resolve_replicas(count, replicas)}) for name, replicas in jobs]
+        results = fan_out(lambda job: self.execute(self.api_handler.scale, job[1], job[0], namespace),
+                          jobs, self.args.get("workers"))
         self.tcp_handler.close()
-        if not check_http_status(json_result, self.args.get("command")):
-            return
+        self.print_bulk_results('scale', [name for name, _ in jobs], results)
 
     def go_set(self):
         if self.args.get("debug"):
             self.log_time()
-        self.tcp_connect()
 
         namespace = self.args.get('namespace')
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
+            namespace = self.config.get("default_namespace")
 
         args = self.args.get("args")
-        if args:
-            if '=' in args:
-                container_name, image = args.split('=')
-                json_to_send = {"name": self.args.get("name"), "image": image}
-                api_result = self.api_handler.set(json_to_send, container_name, namespace)
-            else:
-                try:
-                    replicas_count = int(args)
-                    json_to_send = {"replicas": replicas_count}
-                    api_result = self.api_handler.set(json_to_send, self.args.get("name"), namespace)
-                except (ValueError, TypeError):
-                    print('{}{}{} {}'.format(
-                        BColors.FAIL,
-                        "Error: ",
-                        "Count is not integer",
-                        BColors.ENDC,
-                    ))
-                    return
+        if not args:
+            self.print_error("Empty args")
+            return
 
-            if not self.handle_api_result(api_result):
+        try:
+            parse_selector(self.args.get("selector"))
+        except ValueError as e:
+            self.print_error(e)
+            return
+
+        if '=' in args:
+            container_name, image = args.split('=', 1)
+            relative = False
+        else:
+            try:
+                relative = is_relative_target(args)
+            except ValueError as e:
+                self.print_error(e)
                 return
 
-            json_result = self.get_and_handle_tcp_result('set')
+        self.tcp_connect()
+        jobs = self.resolve_deployments(namespace, self.args.get("name"), self.args.get("selector"),
+                                        need_spec=relative)
+        if jobs is None:
             self.tcp_handler.close()
-            if not check_http_status(json_result, self.args.get("command")):
+            return
+
+        if '=' in args:
+            calls = [(self.api_handler.set, {"name": name, "image": image}, container_name) for name, _ in jobs]
+        else:
+            calls = [(self.api_handler.set, {"replicas": resolve_replicas(args, replicas)}, name)
+                     for name, replicas in jobs]
+        results = fan_out(lambda call: self.execute(call[0], call[1], call[2], namespace),
+                          calls, self.args.get("workers"))
+        self.tcp_handler.close()
+        self.print_bulk_results('set', [name for name, _ in jobs], results)
+
+    def resolve_deployments(self, namespace, names, selector, need_spec=False):
+        """
+        Returns (name, current replicas) pairs for explicit names and/or a label selector,
+        deployments are listed with a single request only when it is needed
+        """
+        names = names or []
+        if not selector and not need_spec:
+            if not names:
+                self.print_error(NO_TARGETS_ERROR)
                 return
+            return [(name, None) for name in names]
+
+        items = self.list_items("deployments", namespace)
+        if items is None:
+            return
+        cached = self.list_cache.select(namespace, "deployments", parse_selector(selector)) \
+            if selector and self.list_cache else None
+        if cached is not None:
+            items = select_items(cached, names)
         else:
-            print('{}{}{} {}'.format(
-                BColors.FAIL,
-                "Error: ",
-                "Empty args",
+            items = select_items(items, names, selector)
+        if not items:
+            self.print_error(NO_TARGETS_ERROR)
+            return
+        return [(i.get("metadata").get("name"), i.get("spec").get("replicas")) for i in items]
+
+    def list_items(self, kind, namespace):
+        tcp_result = self.get_list(kind, namespace)
+        if not check_http_status(tcp_result, "get"):
+            return
+        self.update_completion_index(kind, namespace, tcp_result)
+        return tcp_result.get("results")[0].get("data").get("items") or []
+
+    def get_list(self, kind, namespace, relist=False, forget=False):
+        """
+        Lists objects asking only for changes since the cached resourceVersion,
+        relists once when the server no longer keeps them. With forget the cache
+        keeps no copy of the items in memory, the result is their only holder
+        """
+        if not self.list_cache:
+            return self.execute(self.api_handler.get, kind, None, namespace)
+        version = None if relist else self.list_cache.get_version(namespace, kind)
+        tcp_result = self.execute(self.api_handler.get, kind, None, namespace, version)
+        if version and is_expired(tcp_result):
+            if self.debug:
+                print('{}{}{}'.format(BColors.WARNING, 'resourceVersion expired, relisting', BColors.ENDC))
+            self.list_cache.drop(namespace, kind)
+            tcp_result = self.execute(self.api_handler.get, kind, None, namespace)
+        if tcp_result.get('status') == 'Failure' or not tcp_result.get("results"):
+            return tcp_result
+        result = tcp_result.get("results")[0]
+        with phase("transform"):
+            result["data"] = self.list_cache.merge(namespace, kind, result.get("data") or {})
+        if forget:
+            self.list_cache.forget(namespace, kind)
+        return tcp_result
+
+    def execute(self, api_call, *args):
+        """
+        Sends one api request and waits for its result on the shared channel,
+        safe to call from worker threads
+        """
+        api_result = api_call(*args)
+        if not api_result.get('id'):
+            if 'error' not in api_result:
+                api_result = {'error': 'empty command id'}
+            return api_result
+        if self.debug:
+            print('{}{}{}{}'.format(
+                BColors.OKGREEN,
+                'Command Id: ',
+                api_result.get('id'),
                 BColors.ENDC,
             ))
+        try:
+            return self.tcp_handler.receive(api_result.get('id'))
+        except RuntimeError as e:
+            return {'error': str(e)}
+
+    def print_bulk_results(self, command_name, names, results):
+        for name, result in zip(names, results):
+            if self.context_name and (self.args.get("context") or self.args.get("all_contexts")):
+                name = '{} [{}]'.format(name, self.context_name)
+            check_http_status(result, '{} {}'.format(command_name, name))
+
+    @staticmethod
+    def print_error(error):
+        print('{}{}{} {}'.format(
+            BColors.FAIL,
+            "Error: ",
+            error,
+            BColors.ENDC,
+        ))
+
+    def go_logs(self):
+        if self.debug:
+            self.log_time()
+
+        namespace = self.args.get('namespace')
+        if not namespace:
+            namespace = self.config.get("default_namespace")
+
+        try:
+            since = parse_since(self.args.get("since"))
+        except ValueError as e:
+            self.print_error(e)
+            return
+
+        deploy = self.args.get("deploy")
+        if deploy:
+            self.tcp_connect()
+            items = self.list_items("pods", namespace)
+            self.tcp_handler.close()
+            if items is None:
+                return
+            matched = LabelIndex.from_items(items).with_value(deploy)
+            pods = [items[i].get("metadata").get("name") for i in sorted(matched)]
+            if not pods:
+                self.print_error(NO_PODS_ERROR)
+                return
+        elif self.args.get("name"):
+            pods = [self.args.get("name")]
+        else:
+            self.parser.error(POD_OR_DEPLOY_ERROR)
+            return
+
+        results = fan_out(lambda pod: self.api_handler.logs(pod, namespace, self.args.get("container"),
+                                                            self.args.get("follow"), since, self.args.get("tail")),
+                          pods, self.args.get("workers"))
+        responses = {}
+        for pod, result in zip(pods, results):
+            if isinstance(result, dict):
+                self.print_error('{}: {}'.format(pod, result.get('error')))
+            else:
+                responses[pod] = result
+        if not responses:
+            return
+
+        try:
+            if deploy:
+                write_merged_streams(responses)
+            else:
+                write_stream(responses[pods[0]])
+        except (KeyboardInterrupt, BrokenPipeError):
             return
 
     def go_run(self):
+        if self.args.get("matrix"):
+            self.go_run_matrix()
+            return
         json_to_send = self.construct_run()
         if not json_to_send:
             return
@@ -226,7 +595,7 @@ class Client:
         self.tcp_connect()
         namespace = self.args.get('namespace')
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
+            namespace = self.config.get("default_namespace")
         api_result = self.api_handler.run(json_to_send, namespace)
         if not self.handle_api_result(api_result):
             return
@@ -236,10 +605,133 @@ class Client:
         if not check_http_status(json_result, self.args.get("command")):
             return
 
+    def go_run_matrix(self):
+        manifests = self.construct_run_matrix()
+        if not manifests:
+            return
+        if self.debug:
+            self.log_time()
+
+        self.tcp_connect()
+        namespace = self.args.get('namespace')
+        if not namespace:
+            namespace = self.config.get("default_namespace")
+        results = fan_out(lambda manifest: self.execute(self.api_handler.run, manifest, namespace),
+                          manifests, self.args.get("workers"))
+        self.tcp_handler.close()
+        self.print_bulk_results('run', [m['metadata']['name'] for m in manifests], results)
+
+    def go_wait(self):
+        """
+        Returns process exit code: 0 when every condition holds, 1 on timeout, 2 on errors
+        """
+        try:
+            targets = [parse_target(t) for t in self.args.get("targets")]
+            check = parse_condition(self.args.get("for"))
+        except ValueError as e:
+            self.print_error(e)
+            return EXIT_ERROR
+        if self.debug:
+            self.log_time()
+
+        namespace = self.args.get('namespace')
+        if not namespace:
+            namespace = self.config.get("default_namespace")
+
+        self.tcp_connect()
+        code, errors = wait_for(lambda kind: self.wait_list(kind, namespace), targets, check,
+                                self.args.get("timeout"),
+                                lambda func, jobs: fan_out(func, jobs, self.args.get("workers")))
+        self.tcp_handler.close()
+        for kind, name in targets:
+            if (kind, name) in errors:
+                self.print_error(errors[(kind, name)])
+            elif self.debug:
+                check_http_status({}, 'wait {}/{}'.format(kind, name))
+        return code
+
+    def wait_list(self, kind, namespace):
+        tcp_result = self.get_list(kind, namespace)
+        if tcp_result.get("error"):
+            return tcp_result
+        return tcp_result.get("results")[0].get("data").get("items") or []
+
+    def go_export(self):
+        if self.debug:
+            self.log_time()
+
+        namespace = self.args.get('namespace')
+        if not namespace:
+            namespace = self.config.get("default_namespace")
+        directory = os.path.join(self.path, self.args.get("dir"))
+
+        self.tcp_connect()
+        jobs = list(EXPORT_KINDS) + ["quota"]
+        results = fan_out(lambda kind: self.export_kind(kind, namespace, directory), jobs, self.args.get("workers"))
+        self.tcp_handler.close()
+        self.print_bulk_results('export', jobs, results)
+
+    def export_kind(self, kind, namespace, directory):
+        """
+        Lists kind and writes every object to its own file as soon as the list arrives
+        """
+        if kind == "quota":
+            tcp_result = self.execute(self.api_handler.get_namespaces, namespace)
+            if tcp_result.get("error"):
+                return tcp_result
+            try:
+                write_quota(directory, tcp_result.get("results")[1].get("data"))
+            except (IndexError, AttributeError, OSError) as e:
+                return {'error': str(e)}
+            return tcp_result
+
+        tcp_result = self.get_list(kind, namespace)
+        if tcp_result.get("error"):
+            return tcp_result
+        try:
+            for item in tcp_result.get("results")[0].get("data").get("items") or []:
+                write_manifest(directory, kind, normalize(item, kind))
+        except OSError as e:
+            return {'error': str(e)}
+        return tcp_result
+
+    def go_import(self):
+        if self.debug:
+            self.log_time()
+
+        namespace = self.args.get('namespace')
+        if not namespace:
+            namespace = self.config.get("default_namespace")
+        directory = os.path.join(self.path, self.args.get("dir"))
+        if not os.path.isdir(directory):
+            self.parser.error('no such directory: {}'.format(directory))
+
+        manifests = list(read_manifests(directory))
+        if not manifests:
+            self.print_error(NO_MANIFESTS_ERROR.format(directory))
+            return
+
+        self.tcp_connect()
+        for kind in IMPORT_ORDER:
+            file_names = [file_name for k, file_name in manifests if k == kind]
+            results = fan_out(lambda file_name: self.import_manifest(file_name, namespace),
+                              file_names, self.args.get("workers"))
+            self.print_bulk_results('import', [os.path.relpath(f, directory) for f in file_names], results)
+        self.tcp_handler.close()
+
+    def import_manifest(self, file_name, namespace):
+        try:
+            body = load_manifest(file_name)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            return {'error': str(e)}
+        if not isinstance(body, dict) or not body.get("kind") or not (body.get("metadata") or {}).get("name"):
+            return {'error': 'not a manifest: {}'.format(file_name)}
+        return self.execute(self.api_handler.create, body, namespace)
+
     def go_expose(self):
         namespace = self.args.get('namespace')
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
+            namespace = self.config.get("default_namespace")
 
         json_to_send = self.construct_expose(namespace)
         if self.debug:
@@ -268,7 +760,7 @@ class Client:
         if not namespace:
             namespace = self.args.get('namespace')
             if not namespace:
-                namespace = config_json_data.get("default_namespace")
+                namespace = self.config.get("default_namespace")
 
         api_result = self.api_handler.create(json_to_send, namespace)
         if not self.handle_api_result(api_result):
@@ -303,7 +795,23 @@ class Client:
 
         self.namespace = self.args.get('namespace')
         if not self.namespace:
-            self.namespace = config_json_data.get("default_namespace")
+            self.namespace = self.config.get("default_namespace")
+
+        if kind != "namespaces" and not name and self.args.get("all_namespaces"):
+            json_result = self.get_all_namespaces(kind)
+            self.tcp_handler.close()
+            if json_result:
+                self.print_result(json_result)
+            return json_result
+
+        if kind != "namespaces" and not name:
+            json_result = self.get_list(kind, self.namespace, self.args.get("relist"), forget=True)
+            self.tcp_handler.close()
+            if not check_http_status(json_result, "get"):
+                return
+            self.update_completion_index(kind, self.namespace, json_result)
+            self.print_result(json_result)
+            return json_result
 
         if kind == "namespaces":
             if self.args.get("name"):
@@ -319,11 +827,52 @@ class Client:
         self.tcp_handler.close()
         if not check_http_status(json_result, "get"):
             return
+        if not name and not (kind == "namespaces" and self.args.get("name")):
+            self.update_completion_index(kind, self.namespace, json_result)
         return json_result
 
+    def get_all_namespaces(self, kind):
+        """
+        Lists namespaces once, then lists kind in all of them concurrently
+        and merges the items by creation time into one result
+        """
+        tcp_result = self.execute(self.api_handler.get_namespaces)
+        if not check_http_status(tcp_result, "get"):
+            return
+        self.update_completion_index("namespaces", None, tcp_result)
+        namespaces = [r.get("data").get("metadata").get("namespace") for r in tcp_result.get("results")]
+        namespaces = [n for n in namespaces if n]
+        results = fan_out(lambda namespace: self.get_list(kind, namespace, self.args.get("relist"), forget=True),
+                          namespaces, self.args.get("workers"))
+        item_lists = []
+        data = None
+        for namespace, result in zip(namespaces, results):
+            if not result or result.get("error"):
+                self.print_error('{}: {}'.format(namespace, result.get("error") if result else "TCP result is empty"))
+                continue
+            self.update_completion_index(kind, namespace, result)
+            data = result.get("results")[0].get("data")
+            item_lists.append(data.get("items") or [])
+        if data is None:
+            return
+        with phase("transform"):
+            merged = dict(data, metadata={}, items=merge_by_created(item_lists))
+        return {"results": [{"data": merged}]}
+
+    @staticmethod
+    def update_completion_index(kind, namespace, tcp_result):
+        try:
+            if kind == "namespaces":
+                names = [r.get("data").get("metadata").get("namespace") for r in tcp_result.get("results")]
+            else:
+                names = [i.get("metadata").get("name") for i in tcp_result.get("results")[0].get("data").get("items")]
+        except (AttributeError, IndexError, TypeError):
+            return
+        update_index(namespace, kind, [n for n in names if n])
+
     def get_and_handle_tcp_result(self, command_name):
         try:
-            tcp_result = self.tcp_handler.receive()
+            tcp_result = self.tcp_handler.receive(self.command_id)
             if command_name == 'get':
                 if not tcp_result.get('status') == 'Failure':
                     if self.args.get("debug"):
@@ -354,7 +903,7 @@ class Client:
         self.args['output'] = 'yaml'
         namespace = self.args['namespace']
         if not namespace:
-            namespace = config_json_data.get("default_namespace")
+            namespace = self.config.get("default_namespace")
         if kind != 'namespaces':
             api_result = self.api_handler.delete(kind, name, namespace, self.args.get("pods"))
         else:
@@ -368,27 +917,72 @@ class Client:
             return
 
     def go_replace(self):
-        self.log_time()
-        self.tcp_connect()
-
-        self.args['output'] = 'yaml'
-        namespace = self.args['namespace']
+        self.go_apply(create_missing=False)
 
+    def go_apply(self, create_missing=True):
+        """
+        Sends only a merge patch of the fields the file changes, nothing when the live object
+        already matches, missing objects are created by apply and reported by replace
+        """
+        if self.debug:
+            self.log_time()
         json_to_send = self.get_json_from_file()
-        kind = '{}s'.format(json_to_send.get('kind')).lower()
+        kind, name, namespace = self.get_manifest_target(json_to_send)
 
-        if kind != 'namespaces':
-            api_result = self.api_handler.replace(json_to_send, namespace)
-        else:
-            api_result = self.api_handler.replace_namespaces(json_to_send)
-        if not self.handle_api_result(api_result):
+        self.tcp_connect()
+        if kind == 'namespaces':
+            result = self.execute(self.api_handler.replace_namespaces, json_to_send)
+            self.tcp_handler.close()
+            check_http_status(result, self.args.get("command"))
             return
 
-        json_result = self.get_and_handle_tcp_result('replace')
+        live = self.get_live_object(kind, name, namespace)
+        if live is None and create_missing:
+            result = self.execute(self.api_handler.create, json_to_send, namespace)
+        elif live is None:
+            result = {'error': '{} {} not found'.format(kind, name)}
+        else:
+            patch = merge_patch(live, normalize(json_to_send, kind))
+            if self.debug:
+                print('\n'.join(format_changes(live, patch)) or 'no changes')
+            if patch:
+                result = self.execute(self.api_handler.patch, kind, name, namespace, patch)
+            else:
+                result = {}
+        self.tcp_handler.close()
+        check_http_status(result, '{} {}'.format(self.args.get("command"), name))
+
+    def go_diff(self):
+        """
+        Returns process exit code: 0 when the live object matches the file, 1 when it differs, 2 on errors
+        """
+        json_to_send = self.get_json_from_file()
+        kind, name, namespace = self.get_manifest_target(json_to_send)
 
+        self.tcp_connect()
+        live = self.get_live_object(kind, name, namespace)
         self.tcp_handler.close()
-        if not check_http_status(json_result, self.args.get("command")):
-            return
+        if live is None:
+            self.print_error('{} {} not found'.format(kind, name))
+            return 2
+        lines = format_changes(live, merge_patch(live, normalize(json_to_send, kind)))
+        if lines:
+            print('\n'.join(lines))
+            return 1
+        return 0
+
+    def get_manifest_target(self, body):
+        kind = '{}s'.format(body.get('kind')).lower()
+        name = body['metadata']['name']
+        namespace = self.args.get('namespace') or body['metadata'].get('namespace') or \
+            self.config.get("default_namespace")
+        return kind, name, namespace
+
+    def get_live_object(self, kind, name, namespace):
+        tcp_result = self.execute(self.api_handler.get, kind, name, namespace)
+        if tcp_result.get("error") or not tcp_result.get("results"):
+            return None
+        return tcp_result.get("results")[0].get("data")
 
     def check_file_existence(self):
         if 'file' in self.args:
@@ -404,6 +998,7 @@ class Client:
 
     def handle_api_result(self, api_result):
         if api_result.get('id'):
+            self.command_id = api_result.get('id')
             if self.debug:
                 print('{}{}...{} {}OK{}'.format(
                     BColors.OKBLUE,
@@ -448,17 +1043,63 @@ class Client:
                 BColors.ENDC
             ))
 
-    def print_result(self, result):
+    def print_result(self, result, contexts=False):
         if self.args.get("command") != "expose":
-            if self.args.get('output') == 'yaml':
-                result = result["results"]
-                print(yaml.dump(result, default_flow_style=False))
-            elif self.args['output'] == 'json':
-                result = result["results"]
-                print(json.dumps(result, indent=4))
+            # over the memory budget output is written piece by piece instead of as one string
+            stream = over_budget(self.memory_budget)
+            if stream and self.debug:
+                print('{}{}{}'.format(BColors.WARNING, 'memory budget exceeded, streaming output', BColors.ENDC))
+            if self.query:
+                result = self.apply_query(result)
+                if result is None:
+                    return
+            with phase("render"):
+                if self.args.get('output') == 'yaml':
+                    result = result["results"]
+                    if stream:
+                        yaml.dump(result, sys.stdout, default_flow_style=False)
+                    else:
+                        print(yaml.dump(result, default_flow_style=False))
+                elif self.args['output'] == 'json':
+                    result = result["results"]
+                    if stream:
+                        json.dump(result, sys.stdout, indent=4)
+                        print()
+                    else:
+                        print(json.dumps(result, indent=4))
+                else:
+                    deploy = self.args.get("deploy")
+                    TcpApiParser(result, deploy=deploy, all_namespaces=self.args.get("all_namespaces"),
+                                 contexts=contexts, stream=stream, keep_order=bool(self.query and self.query.sort_by))
+
+    def apply_query(self, result):
+        """
+        Filters and sorts list items for --where and --sort-by, --group-by groups are printed here
+        and None is returned
+        """
+        results = result.get("results") or []
+        data = (results[0].get("data") or {}) if results else {}
+        if not str(data.get("kind")).endswith("List"):
+            self.print_error(QUERY_LIST_ERROR)
+            return None
+        items = data.get("items") or []
+        with phase("transform"):
+            if not self.query.group_by:
+                # in place, so the items filtered out are freed before rendering
+                items[:] = self.query.select(items)
+                return result
+            groups = self.query.group(items)
+        with phase("render"):
+            if self.args.get('output') in ('yaml', 'json'):
+                groups = [{"group": key, "count": count, "sums": dict(zip(self.query.sums, totals))}
+                          for key, count, totals in groups]
+                if self.args.get('output') == 'yaml':
+                    print(yaml.dump(groups, default_flow_style=False))
+                else:
+                    print(json.dumps(groups, indent=4))
             else:
-                deploy = self.args.get("deploy")
-                TcpApiParser(result, deploy=deploy)
+                show_groups(self.query.group_by, self.query.sums, groups, over_budget(self.memory_budget))
+        return None
 
     def log_time(self):
         if self.args["debug"]:
@@ -469,7 +1110,6 @@ class Client:
             ))
 
     def construct_run(self):
-        json_to_send = deployment_json
         if not self.args["name"].islower():
             e = LOWER_CASE_ERROR
             print('{}{}{} {}'.format(
@@ -479,67 +1119,55 @@ class Client:
             BColors.ENDC,
             ))
             return
-        json_to_send['metadata']['name'] = self.args['name']
 
         if self.args["configure"] and not self.args.get("image"):
             runconfigure = RunConfigure()
             param_dict = runconfigure.get_data_from_console()
             if not param_dict:
                 return
-            image = param_dict["image"]
-            ports = param_dict["ports"]
-            labels = param_dict["labels"]
-            env = param_dict["env"]
-            cpu = param_dict["cpu"]
-            memory = param_dict["memory"]
-            replicas = param_dict["replicas"]
-            commands = param_dict["commands"]
 
         elif self.args.get("image") and not self.args["configure"]:
-            image = self.args["image"]
-            ports = self.args["ports"]
-            labels = self.args["labels"]
-            env = self.args["env"]
-            cpu = self.args["cpu"]
-            memory = self.args["memory"]
-            replicas = self.args["replicas"]
-            commands = self.args["commands"]
+            param_dict = self.get_run_params()
 
         if not self.args["configure"] and not self.args["image"]:
             self.parser.error(NO_IMAGE_AND_CONFIGURE_ERROR)
             return
 
-        json_to_send['spec']['replicas'] = replicas
-        json_to_send['spec']['template']['spec']['containers'][0]['name'] = self.args['name']
-        json_to_send['spec']['template']['spec']['containers'][0]['image'] = image
-        if commands:
-            json_to_send['spec']['template']['spec']['containers'][0]['command'] = commands
-        if ports:
-            json_to_send['spec']['template']['spec']['containers'][0]['ports'] = []
-            for port in ports:
-                json_to_send['spec']['template']['spec']['containers'][0]['ports'].append({
-                    'containerPort': port
-                })
-        if labels:
-            for key, value in labels.items():
-                json_to_send['metadata']['labels'].update({key: value})
-                json_to_send['spec']['template']['metadata']['labels'].update({key: value})
-        if env:
-            json_to_send['spec']['template']['spec']['containers'][0]['env'] = [
-                {
-                    "name": key,
-                    "value": value
-                }
-                for key, value in env.items()]
-        json_to_send['spec']['template']['spec']['containers'][0]['resources']["requests"]['cpu'] = cpu
-        json_to_send['spec']['template']['spec']['containers'][0]['resources']["requests"]['memory'] = memory
+        json_to_send = build_deployment(self.args['name'], **param_dict)
         with open(os.path.join(os.getenv("HOME") + "/.containerum/src/", JSON_TEMPLATES_RUN_FILE), 'w', encoding='utf-8') as w:
             json.dump(json_to_send, w, indent=4)
 
         return json_to_send
 
-    def get_json_from_file(self):
-        file_name = os.path.join(self.path, self.args['file'])
+    def construct_run_matrix(self):
+        if not self.args["name"].islower():
+            self.print_error(LOWER_CASE_ERROR)
+            return
+        matrix = self.get_json_from_file(self.args["matrix"])
+        params = self.get_run_params()
+        if not params.get("image") and not (isinstance(matrix, dict) and "image" in matrix):
+            self.parser.error(NO_IMAGE_AND_CONFIGURE_ERROR)
+            return
+        try:
+            return build_matrix(self.args["name"], matrix, **params)
+        except (ValueError, TypeError) as e:
+            self.print_error(e)
+            return
+
+    def get_run_params(self):
+        return {
+            "image": self.args["image"],
+            "ports": self.args["ports"],
+            "labels": self.args["labels"],
+            "env": self.args["env"],
+            "cpu": self.args["cpu"],
+            "memory": self.args["memory"],
+            "replicas": self.args["replicas"],
+            "commands": self.args["commands"],
+        }
+
+    def get_json_from_file(self, file_name=None):
+        file_name = os.path.join(self.path, file_name or self.args['file'])
         try:
             with open(file_name, 'r', encoding='utf-8') as f:
                 body = json.load(f)
@@ -553,7 +1181,7 @@ class Client:
 
         try:
             with open(file_name, 'r', encoding='utf-8') as f:
-                body = yaml.load(f)
+                body = yaml.safe_load(f)
                 return body
         except FileNotFoundError:
             self.parser.error('no such file: {}'.format(
@@ -605,40 +1233,18 @@ class Client:
             self.parser.error(NAME_OR_FILE_BOTH_ERROR)
 
     def construct_expose(self, namespace):
-        labels = {}
-        is_external = {"external": "true"}
-        json_to_send = service_json
-        ports = self.args.get("ports")
         self.args["kind"] = "deployments"
-        if ports:
-            for p in ports:
-                p = p.split(":")
-                if len(p) == 3:
-                    if p[2].upper() == "TCP" or p[2].upper() == "UDP":
-                        json_to_send["spec"]["ports"].append({"name": p[0], "protocol": p[2].upper(), "targetPort": int(p[1])})
-                    else:
-                        json_to_send["spec"]["ports"].append({"name": p[0],"protocol": "TCP", "port": int(p[2]), "targetPort": int(p[1])})
-                        is_external["external"] = "false"
-                if len(p) == 4:
-                    json_to_send["spec"]["ports"].append({"name": p[0], "port": int(p[2]), "protocol": p[3].upper(),
-                                                         "targetPort": int(p[1])})
-                    is_external["external"] = "false"
-                elif len(p) == 2:
-                    json_to_send["spec"]["ports"].append({"name": p[0], "protocol": "TCP", "targetPort": int(p[1])})
+        try:
+            # build_expose parses them again, checked here to report bad ports before any request
+            for port in self.args.get("ports") or []:
+                parse_service_port(port)
+        except ValueError as e:
+            self.print_error(e)
+            return
         result = self.go_get()
         if not result:
             return
-        namespace_hash = sha256(namespace.encode('utf-8')).hexdigest()[:32]
-        labels.update({namespace_hash: self.args.get("name")})
-        json_to_send["metadata"]["labels"].update(labels)
-
-        json_to_send["metadata"]["labels"].update(is_external)
-        json_to_send["metadata"]["name"] = self.args["name"] + "-" + \
-                                           md5((self.args.get("name")+str(datetime.now()))
-                                               .encode("utf-8")).hexdigest()[:4]
-        json_to_send["spec"]["selector"].update(labels)
+        json_to_send = build_expose(self.args.get("name"), namespace, self.args.get("ports"))
         with open(os.path.join(os.getenv("HOME") + "/.containerum/src/", JSON_TEMPLATES_EXPOSE_FILE), 'w', encoding='utf-8') as w:
                 json.dump(json_to_send, w, indent=4)
         return json_to_send
-
-
@@ -0,0 +1,112 @@
+import os
+import os.path
+import subprocess
+import sys
+import time
+from config_json_handler import get_config_dir
+
+INDEX_DIR = "index"
+NAMESPACES_FILE = "_namespaces"
+INDEX_TTL = 60
+REFRESH_LOCK_TTL = 30
+
+KIND_ALIASES = {
+    "po": "pods",
+    "pod": "pods",
+    "pods": "pods",
+    "deploy": "deployments",
+    "deployment": "deployments",
+    "deployments": "deployments",
+    "svc": "services",
+    "service": "services",
+    "services": "services",
+    "ns": "namespaces",
+    "namespace": "namespaces",
+    "namespaces": "namespaces",
+}
+
+
+def get_index_file(namespace, kind):
+    index_dir = os.path.join(get_config_dir(), INDEX_DIR)
+    if kind == "namespaces":
+        return os.path.join(index_dir, NAMESPACES_FILE)
+    return os.path.join(index_dir, namespace, kind)
+
+
+def update_index(namespace, kind, names):
+    """
+    Stores object names of kind in namespace, one name per line, file mtime is the refresh time
+    """
+    file_name = get_index_file(namespace, kind)
+    try:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        tmp_file_name = '{}.{}'.format(file_name, os.getpid())
+        with open(tmp_file_name, 'w', encoding='utf-8') as w:
+            w.write("\n".join(sorted(set(names))))
+        os.replace(tmp_file_name, file_name)
+    except OSError:
+        pass
+
+
+def read_index(namespace, kind):
+    """
+    Returns (names, is_stale) without touching the network
+    """
+    file_name = get_index_file(namespace, kind)
+    try:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            names = f.read().split("\n")
+        return [n for n in names if n], time.time() - os.path.getmtime(file_name) > INDEX_TTL
+    except OSError:
+        return [], True
+
+
+def refresh_in_background(namespace, kind):
+    """
+    Starts detached «chkit get KIND -o json» which updates the index when it finishes
+    """
+    lock_file = get_index_file(namespace, kind) + ".refresh"
+    try:
+        if time.time() - os.path.getmtime(lock_file) < REFRESH_LOCK_TTL:
+            return
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+        open(lock_file, 'w').close()
+        if getattr(sys, "frozen", False):
+            command = [sys.executable]
+        else:
+            command = [sys.executable, os.path.abspath(sys.argv[0])]
+        command += ["get", kind, "--output", "json"]
+        if kind != "namespaces":
+            command += ["--namespace", namespace]
+        env = {key: value for key, value in os.environ.items()
+               if not key.startswith("_ARGCOMPLETE") and not key.startswith("COMP_")}
+        subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, env=env, start_new_session=True)
+    except OSError:
+        pass
+
+
+def get_default_namespace():
+    from config_json_handler import get_json_from_config
+    return get_json_from_config().get("default_namespace")
+
+
+class ResourceCompleter:
+    """
+    argcomplete completer for object names, kind is fixed or taken from the KIND argument
+    """
+    def __init__(self, kind=None):
+        self.kind = kind
+
+    def __call__(self, prefix, parsed_args, **kwargs):
+        kind = KIND_ALIASES.get(self.kind or getattr(parsed_args, "kind", None) or "", None)
+        if not kind:
+            return []
+        namespace = getattr(parsed_args, "namespace", None) or get_default_namespace()
+        names, is_stale = read_index(namespace, kind)
+        if is_stale:
+            refresh_in_background(namespace, kind)
+        return [name for name in names if name.startswith(prefix)]
@@ -0,0 +1,56 @@
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+COMPRESS_MIN_SIZE = 1024
+
+
+def get_accept_encoding():
+    if zstandard:
+        return "zstd, gzip, deflate"
+    return "gzip, deflate"
+
+
+def get_stream_encodings():
+    """
+    Encodings offered for the tcp result stream in AUTH_FORM, most preferred first
+    """
+    if zstandard:
+        return ["zstd", "deflate", "gzip"]
+    return ["deflate", "gzip"]
+
+
+def compress_body(data, min_size=COMPRESS_MIN_SIZE):
+    """
+    Returns (data, content encoding), small bodies are sent as is
+    """
+    if len(data) < min_size:
+        return data, None
+    return gzip.compress(data, compresslevel=6), "gzip"
+
+
+def decode_content(content, content_encoding):
+    """
+    requests decodes gzip and deflate itself, zstd bodies are decoded here when it did not
+    """
+    if content_encoding == "zstd" and zstandard and content[:4] == ZSTD_MAGIC:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    return content
+
+
+def get_stream_decompressor(encoding):
+    """
+    Returns an object with decompress(bytes) for the negotiated tcp stream encoding or None
+    """
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "zstd" and zstandard:
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
@@ -1,3 +1,4 @@
+import copy
 import json
 from bcolors import BColors
 from keywords import SUCCESS_CHANGED
@@ -5,20 +6,38 @@ import os
 import os.path
 import re
 from data import config_json
-FILE_CONFIG = os.path.join(os.getenv("HOME"), ".containerum/CONFIG.json")
-FILE_CONFIG_FROM_SRC = os.path.join(os.getenv("HOME"), ".containerum/src/CONFIG.json")
+DEFAULT_CONFIG_DIR = "~/.containerum"
+
+_config_dir = None
+
+
+def set_config_dir(config_dir):
+    """
+    Directory of CONFIG.json and the caches of the process, ~/.containerum unless set
+    """
+    global _config_dir
+    _config_dir = config_dir
+
+
+def get_config_dir():
+    # resolved on use, importing chkit modules must not need HOME
+    return os.path.expanduser(_config_dir or DEFAULT_CONFIG_DIR)
+
+
+def get_config_file():
+    return os.path.join(get_config_dir(), "CONFIG.json")
 
 
 def get_json_from_config():
     try:
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         return data
     except FileNotFoundError:
         data = config_json
         os.system("mkdir -p $HOME/.containerum/src/json_templates")
         os.system("chmod 777 -R $HOME/.containerum/")
-        with open(FILE_CONFIG, "w") as file:
+        with open(get_config_file(), "w") as file:
             file.write(json.dumps(data,  indent=4))
         file.close()
         return data
@@ -26,7 +45,7 @@ def get_json_from_config():
 
 def show_namespace_token_from_config():
     try:
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         print('{}namespace: {} {}'.format(
                 BColors.OKGREEN,
@@ -38,6 +57,98 @@ def show_namespace_token_from_config():
                 data.get("tcp_handler").get("AUTH_FORM")["token"],
                 BColors.ENDC
             ))
+        for name in sorted(data.get("contexts") or {}):
+            print('{}context: {}{} {}'.format(
+                    BColors.OKGREEN,
+                    name,
+                    " (current)" if name == data.get("current_context") else "",
+                    BColors.ENDC
+                ))
+        return True
+
+    except Exception as e:
+        print('{}{}{} {}'.format(
+                BColors.FAIL,
+                "Error: ",
+                e,
+                BColors.ENDC,
+            ))
+        return False
+
+
+def get_context_config(data, name):
+    """
+    Returns a copy of config with server, tcp address, token and default namespace
+    of context name put in place, contexts live in "contexts" of CONFIG.json:
+        {"eu": {"server": "http://...", "TCP_IP": "...", "TCP_PORT": 3000, "token": "...",
+                "default_namespace": "...", "servers": [...], "tcp_endpoints": ["HOST:PORT", ...]}}
+    """
+    context = (data.get("contexts") or {})[name]
+    data = copy.deepcopy(data)
+    if context.get("server"):
+        data["api_handler"]["server"] = context["server"]
+    if context.get("TCP_IP"):
+        data["tcp_handler"]["TCP_IP"] = context["TCP_IP"]
+    if context.get("TCP_PORT"):
+        data["tcp_handler"]["TCP_PORT"] = context["TCP_PORT"]
+    data["api_handler"]["servers"] = context.get("servers") or []
+    data["tcp_handler"]["ENDPOINTS"] = context.get("tcp_endpoints") or []
+    if context.get("token"):
+        data["tcp_handler"]["AUTH_FORM"]["token"] = context["token"]
+        data["api_handler"]["headers"]["Authorization"] = context["token"]
+    if context.get("default_namespace"):
+        data["default_namespace"] = context["default_namespace"]
+    data["current_context"] = name
+    return data
+
+
+def add_context_to_json_config(name, server, tcp_address, token=None):
+    try:
+        json_data = open(get_config_file()).read()
+        data = json.loads(json_data)
+        tcp_ip, _, tcp_port = tcp_address.rpartition(":")
+        context = {"server": server, "TCP_IP": tcp_ip, "TCP_PORT": int(tcp_port)}
+        if token:
+            context["token"] = token
+        data.setdefault("contexts", {})[name] = context
+        with open(get_config_file(), "w") as file:
+            file.write(json.dumps(data,  indent=4))
+        print('{}{} {}'.format(
+                BColors.OKBLUE,
+                SUCCESS_CHANGED,
+                BColors.ENDC
+            ))
+        return True
+
+    except Exception as e:
+        print('{}{}{} {}'.format(
+                BColors.FAIL,
+                "Error: ",
+                e,
+                BColors.ENDC,
+            ))
+        return False
+
+
+def set_current_context_to_json_config(name):
+    try:
+        json_data = open(get_config_file()).read()
+        data = json.loads(json_data)
+        if name and name not in (data.get("contexts") or {}):
+            raise ValueError("no such context: {}".format(name))
+        data["current_context"] = name or None
+        with open(get_config_file(), "w") as file:
+            file.write(json.dumps(data,  indent=4))
+        print('{}{} {}'.format(
+                BColors.OKBLUE,
+                SUCCESS_CHANGED,
+                BColors.ENDC
+            ))
+        print('{}context: {} {}'.format(
+                BColors.OKGREEN,
+                name or "-",
+                BColors.ENDC
+            ))
         return True
 
     except Exception as e:
@@ -54,11 +165,11 @@ def set_token_to_json_config(token):
     try:
         if not re.match("^(?:[A-Za-z0-9+/]{4})*(?:[A-Za-z0-9+/]{2}==|[A-Za-z0-9+/]{3}=)?$", token):
             raise ValueError("token is invalid")
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         data.get("tcp_handler").get("AUTH_FORM")["token"] = token
         data.get("api_handler").get("headers")["Authorization"] = token
-        with open(FILE_CONFIG, "w") as file:
+        with open(get_config_file(), "w") as file:
             file.write(json.dumps(data,  indent=4))
         file.close()
         print('{}{}{} '.format(
@@ -86,10 +197,10 @@ def set_token_to_json_config(token):
 
 def set_default_namespace_to_json_config(namespace):
     try:
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         data["default_namespace"] = namespace
-        with open(FILE_CONFIG, "w") as file:
+        with open(get_config_file(), "w") as file:
             file.write(json.dumps(data,  indent=4))
         file.close()
         print('{}{} {}'.format(
@@ -116,10 +227,10 @@ def set_default_namespace_to_json_config(namespace):
 
 def set_web_token_to_json_config(web_token):
     try:
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         data.get("webclient_api_handler")["headers"]["Authorization"] = web_token
-        with open(FILE_CONFIG, "w") as file:
+        with open(get_config_file(), "w") as file:
             file.write(json.dumps(data, file, indent=4))
         file.close()
         print('{}{} {}'.format(
@@ -141,11 +252,11 @@ def set_web_token_to_json_config(web_token):
 
 def set_password_username_to_json_config(username,password):
     try:
-        json_data = open(FILE_CONFIG).read()
+        json_data = open(get_config_file()).read()
         data = json.loads(json_data)
         data.get("webclient_api_handler")["username"] = username
         data.get("webclient_api_handler")["password"] = password
-        with open(FILE_CONFIG, "w") as file:
+        with open(get_config_file(), "w") as file:
             file.write(json.dumps(data, file, indent=4))
         file.close()
         print('{}{} {}'.format(
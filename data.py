@@ -99,7 +99,17 @@ config_json = {
             "Authorization": ""
         },
         "TIMEOUT": 10,
-        "server": "http://sdk.containerum.io:3333"
+        "COMPRESS_REQUESTS": False,
+        "RATE_LIMIT": {
+            "rate": 50,
+            "burst": 50,
+            "concurrency": 8,
+            "min_concurrency": 1,
+            "max_concurrency": 64
+        },
+        "RATE_LIMIT_BY_SERVER": {},
+        "server": "http://sdk.containerum.io:3333",
+        "servers": []
     },
     "tcp_handler": {
         "TCP_IP": "sdk.containerum.io",
@@ -107,7 +117,14 @@ config_json = {
             "token": ""
         },
         "BUFFER_SIZE": 1024,
-        "TCP_PORT": 3000
+        "TCP_PORT": 3000,
+        "ENDPOINTS": [],
+        "CONNECT_TIMEOUT": 5,
+        "DNS_TTL": 300,
+        "RECONNECT_ATTEMPTS": 5,
+        "RECONNECT_BACKOFF": 0.5,
+        "COMPRESSION": True,
+        "BINARY_FRAMING": True
     },
     "default_namespace": "default"
 }
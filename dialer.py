@@ -0,0 +1,183 @@
+import errno
+import ipaddress
+import json
+import os
+import os.path
+import selectors
+import socket
+import threading
+import time
+from config_json_handler import get_config_dir
+
+DNS_CACHE_FILE = "dns.json"
+DNS_TTL = 300
+CONNECT_TIMEOUT = 5
+ATTEMPT_DELAY = 0.25
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 5
+
+_lock = threading.Lock()
+
+
+def get_dns_cache_file():
+    return os.path.join(get_config_dir(), DNS_CACHE_FILE)
+
+
+def load_dns_cache():
+    try:
+        with open(get_dns_cache_file(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_dns_cache(host, addresses):
+    """
+    Merges one host into the file, addresses None drops it
+    """
+    with _lock:
+        cache = load_dns_cache()
+        if addresses is None:
+            if cache.pop(host, None) is None:
+                return
+        else:
+            cache[host] = {"addresses": addresses, "resolved": time.time()}
+        file_name = get_dns_cache_file()
+        try:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            tmp_file_name = '{}.{}'.format(file_name, os.getpid())
+            with open(tmp_file_name, 'w', encoding='utf-8') as w:
+                json.dump(cache, w)
+            os.replace(tmp_file_name, file_name)
+        except OSError:
+            pass
+
+
+def is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def lookup(host, port):
+    """
+    Returns [family, ip] pairs, ipv6 and ipv4 interleaved ipv6 first as RFC 8305 asks
+    """
+    infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    by_family = {socket.AF_INET6: [], socket.AF_INET: []}
+    for family, _, _, _, sockaddr in infos:
+        if family in by_family and [int(family), sockaddr[0]] not in by_family[family]:
+            by_family[family].append([int(family), sockaddr[0]])
+    ipv6, ipv4 = by_family[socket.AF_INET6], by_family[socket.AF_INET]
+    addresses = []
+    for i in range(max(len(ipv6), len(ipv4))):
+        addresses.extend(ipv6[i:i + 1] + ipv4[i:i + 1])
+    return addresses
+
+
+def refresh(host, port):
+    try:
+        save_dns_cache(host, lookup(host, port))
+    except OSError:
+        pass
+
+
+def resolve(host, port, ttl=DNS_TTL, fresh=False):
+    """
+    Returns ([family, ip] pairs, cached). A cached entry older than ttl is still used and
+    resolved again in the background, so only the first run pays for the lookup
+    """
+    if is_ip(host):
+        return [[int(socket.AF_INET6 if ':' in host else socket.AF_INET), host]], False
+    if not fresh:
+        entry = load_dns_cache().get(host)
+        if entry and entry.get("addresses"):
+            if time.time() - entry.get("resolved", 0) > ttl:
+                threading.Thread(target=refresh, args=(host, port), daemon=True).start()
+            return entry["addresses"], True
+    addresses = lookup(host, port)
+    save_dns_cache(host, addresses)
+    return addresses, False
+
+
+def set_options(s):
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+                          ("TCP_KEEPCNT", KEEPALIVE_COUNT)):
+        if hasattr(socket, option):
+            s.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+def race(addresses, port, deadline):
+    """
+    Happy eyeballs: starts a connect to the next address every ATTEMPT_DELAY seconds
+    (or right away when an attempt fails) and keeps the first one that succeeds
+    """
+    candidates = list(addresses)
+    pending = {}
+    selector = selectors.DefaultSelector()
+    error = None
+    next_attempt = 0
+    try:
+        while candidates or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if candidates and now >= next_attempt:
+                family, ip = candidates.pop(0)
+                s = socket.socket(family, socket.SOCK_STREAM)
+                s.setblocking(False)
+                code = s.connect_ex((ip, port))
+                if code == 0:
+                    return s
+                if code not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    s.close()
+                    error = OSError(code, os.strerror(code))
+                    continue
+                selector.register(s, selectors.EVENT_WRITE)
+                pending[s] = ip
+                next_attempt = now + ATTEMPT_DELAY
+            timeout = deadline - now
+            if candidates:
+                timeout = min(timeout, max(0, next_attempt - now))
+            for key, _ in selector.select(timeout):
+                s = key.fileobj
+                selector.unregister(s)
+                pending.pop(s)
+                code = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code == 0:
+                    return s
+                s.close()
+                error = OSError(code, os.strerror(code))
+                next_attempt = 0
+        raise error or socket.timeout("connect timed out")
+    finally:
+        selector.close()
+        for s in pending:
+            s.close()
+
+
+def connect(address, timeout=CONNECT_TIMEOUT, dns_ttl=DNS_TTL):
+    """
+    Connects to (host, port) over ipv6 or ipv4, whichever answers first within timeout,
+    and returns a blocking socket with TCP_NODELAY and keepalive set
+    """
+    host, port = address
+    deadline = time.monotonic() + timeout
+    addresses, cached = resolve(host, port, dns_ttl)
+    try:
+        s = race(addresses, port, deadline)
+    except OSError:
+        if not cached:
+            raise
+        # the cached addresses may be outdated, resolve again and retry with the time left
+        save_dns_cache(host, None)
+        addresses, _ = resolve(host, port, dns_ttl, fresh=True)
+        s = race(addresses, port, deadline)
+    s.setblocking(True)
+    set_options(s)
+    return s
@@ -0,0 +1,109 @@
+import json
+import os
+import os.path
+import threading
+import time
+from urllib.parse import urlsplit
+import dialer
+from config_json_handler import get_config_dir
+
+ENDPOINTS_FILE = "endpoints.json"
+PROBE_TTL = 300
+PROBE_TIMEOUT = 1
+FAILED_LATENCY = float("inf")
+
+_lock = threading.Lock()
+
+
+def get_address(endpoint):
+    """
+    Returns (host, port) of an api url or a HOST:PORT tcp endpoint
+    """
+    if "://" in endpoint:
+        parts = urlsplit(endpoint)
+        return parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+    host, _, port = endpoint.rpartition(":")
+    return host, int(port)
+
+
+def get_endpoints_file():
+    return os.path.join(get_config_dir(), ENDPOINTS_FILE)
+
+
+def load_probes():
+    try:
+        with open(get_endpoints_file(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_probes(updates):
+    """
+    Merges probe results into the file, other processes may have written it meanwhile
+    """
+    with _lock:
+        probes = load_probes()
+        probes.update(updates)
+        file_name = get_endpoints_file()
+        try:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            tmp_file_name = '{}.{}'.format(file_name, os.getpid())
+            with open(tmp_file_name, 'w', encoding='utf-8') as w:
+                json.dump(probes, w)
+            os.replace(tmp_file_name, file_name)
+        except OSError:
+            pass
+
+
+def probe(endpoint, timeout=PROBE_TIMEOUT):
+    """
+    Tcp connect time in seconds, the cheapest check that the endpoint is reachable
+    """
+    started = time.monotonic()
+    try:
+        dialer.connect(get_address(endpoint), timeout).close()
+    except (OSError, ValueError):
+        return FAILED_LATENCY
+    return time.monotonic() - started
+
+
+def probe_all(endpoints):
+    results = {}
+    threads = [threading.Thread(target=lambda e: results.__setitem__(e, probe(e)), args=(e,), daemon=True)
+               for e in endpoints]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    save_probes({e: {"latency": None if latency == FAILED_LATENCY else latency, "checked": time.time()}
+                 for e, latency in results.items()})
+    return results
+
+
+def mark_failed(endpoint):
+    save_probes({endpoint: {"latency": None, "checked": time.time()}})
+
+
+def rank(endpoints):
+    """
+    Returns endpoints ordered fastest healthy first, failed last. Probes cached in
+    ENDPOINTS_FILE are used right away and refreshed in the background when stale,
+    endpoints never probed are probed before ranking
+    """
+    endpoints = list(dict.fromkeys(endpoints))
+    if len(endpoints) < 2:
+        return endpoints
+    probes = load_probes()
+    unknown = [e for e in endpoints if e not in probes]
+    if unknown:
+        for endpoint, latency in probe_all(unknown).items():
+            probes[endpoint] = {"latency": None if latency == FAILED_LATENCY else latency, "checked": time.time()}
+    stale = [e for e in endpoints if e not in unknown and time.time() - probes[e].get("checked", 0) > PROBE_TTL]
+    if stale:
+        threading.Thread(target=probe_all, args=(stale,), daemon=True).start()
+
+    def latency(endpoint):
+        value = probes[endpoint].get("latency")
+        return FAILED_LATENCY if value is None else value
+    return sorted(endpoints, key=latency)
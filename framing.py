@@ -0,0 +1,114 @@
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+LENGTH_PREFIX = struct.Struct(">I")
+MAX_READ_SIZE = 1 << 20
+
+
+class JsonLineFramer:
+    """
+    Newline delimited json frames, the default framing of the tcp channel
+    """
+    name = "json"
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanned = 0
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_frame(self):
+        end = self.buffer.find(b'\n', self.scanned)
+        if end < 0:
+            self.scanned = len(self.buffer)
+            return None
+        frame = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+        self.scanned = 0
+        return frame
+
+    def missing(self):
+        return 0
+
+    @staticmethod
+    def decode(frame):
+        return json.loads(frame.decode('utf-8'))
+
+    @staticmethod
+    def encode(obj):
+        return json.dumps(obj).encode('utf-8') + b'\n'
+
+
+class LengthPrefixedFramer:
+    """
+    4-byte big endian length followed by a binary encoded payload,
+    frames are cut by length so the buffer is never scanned
+    """
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_frame(self):
+        if len(self.buffer) < LENGTH_PREFIX.size:
+            return None
+        length = LENGTH_PREFIX.unpack_from(self.buffer)[0]
+        end = LENGTH_PREFIX.size + length
+        if len(self.buffer) < end:
+            return None
+        frame = bytes(self.buffer[LENGTH_PREFIX.size:end])
+        del self.buffer[:end]
+        return frame
+
+    def missing(self):
+        """
+        Bytes still needed to complete the current frame, lets the reader recv exactly that much
+        """
+        if len(self.buffer) < LENGTH_PREFIX.size:
+            return LENGTH_PREFIX.size - len(self.buffer)
+        length = LENGTH_PREFIX.unpack_from(self.buffer)[0]
+        return min(LENGTH_PREFIX.size + length - len(self.buffer), MAX_READ_SIZE)
+
+    def decode(self, frame):
+        return self.loads(frame)
+
+    def encode(self, obj):
+        payload = self.dumps(obj)
+        return LENGTH_PREFIX.pack(len(payload)) + payload
+
+
+def get_framings():
+    """
+    Framings offered in AUTH_FORM, most preferred first, json is always available
+    """
+    framings = []
+    if msgpack:
+        framings.append("msgpack")
+    if cbor2:
+        framings.append("cbor")
+    framings.append("json")
+    return framings
+
+
+def get_framer(name):
+    if name == "msgpack" and msgpack:
+        return LengthPrefixedFramer("msgpack", lambda frame: msgpack.unpackb(frame, raw=False),
+                                    lambda obj: msgpack.packb(obj, use_bin_type=True))
+    if name == "cbor" and cbor2:
+        return LengthPrefixedFramer("cbor", cbor2.loads, cbor2.dumps)
+    return JsonLineFramer()
@@ -14,3 +14,4 @@ JSON_TEMPLATES_EXPOSE_FILE = "json_templates/expose.json"
 
 LOWER_CASE_ERROR = "Name must contain only lowercase symbols!"
 NO_IMAGE_AND_CONFIGURE_ERROR = "No arguments named --image or --configure!"
+NO_PODS_ERROR = "No pods found for deploy!"
@@ -0,0 +1,142 @@
+import re
+
+SELECTOR_ERROR = "selector should be a comma separated list of KEY=VALUE, KEY!=VALUE, KEY in (A,B), " \
+                 "KEY notin (A,B), KEY or !KEY: {}"
+
+EQUALS, NOT_EQUALS, IN, NOT_IN, EXISTS, NOT_EXISTS = "=", "!=", "in", "notin", "exists", "!exists"
+NEGATIVE = (NOT_EQUALS, NOT_IN, NOT_EXISTS)
+
+REQUIREMENT = re.compile(r'^\s*(?:'
+                         r'(?P<set_key>[^\s!=,()]+)\s+(?P<set_op>in|notin)\s*\((?P<values>[^()]*)\)'
+                         r'|(?P<key>[^\s!=,()]+)\s*(?P<op>==|=|!=)\s*(?P<value>[^\s!=,()]*)'
+                         r'|(?P<not>!)?\s*(?P<exists_key>[^\s!=,()]+)'
+                         r')\s*$')
+
+
+def split_selector(selector):
+    """
+    Splits on commas outside of parentheses
+    """
+    parts, depth, start = [], 0, 0
+    for position, char in enumerate(selector):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(selector[start:position])
+            start = position + 1
+    parts.append(selector[start:])
+    return parts
+
+
+def parse_selector(selector):
+    """
+    Returns (key, operator, values) requirements of a label selector:
+    app=web, tier!=back, env in (prod,stage), env notin (dev), canary, !canary
+    """
+    requirements = []
+    for part in split_selector(selector or ""):
+        if not part.strip():
+            continue
+        match = REQUIREMENT.match(part)
+        if not match:
+            raise ValueError(SELECTOR_ERROR.format(part.strip()))
+        if match.group("set_key"):
+            values = frozenset(v.strip() for v in match.group("values").split(",") if v.strip())
+            requirements.append((match.group("set_key"), match.group("set_op"), values))
+        elif match.group("key"):
+            op = NOT_EQUALS if match.group("op") == "!=" else EQUALS
+            requirements.append((match.group("key"), op, frozenset([match.group("value")])))
+        else:
+            requirements.append((match.group("exists_key"), NOT_EXISTS if match.group("not") else EXISTS,
+                                 frozenset()))
+    return requirements
+
+
+def from_match_labels(labels):
+    return [(key, EQUALS, frozenset([value])) for key, value in (labels or {}).items()]
+
+
+def get_labels(item):
+    return (item.get("metadata") or {}).get("labels") or {}
+
+
+class LabelIndex:
+    """
+    Inverted index of labels: key -> value -> ids of the objects carrying it. Ids are whatever
+    the owner finds objects by again, list positions or cache keys. Selecting costs the size of
+    the postings it touches, not the number of objects
+    """
+    def __init__(self):
+        self.postings = {}
+        self.labels = {}
+
+    @classmethod
+    def from_items(cls, items):
+        index = cls()
+        for position, item in enumerate(items):
+            index.add(position, get_labels(item))
+        return index
+
+    def add(self, object_id, labels):
+        self.remove(object_id)
+        self.labels[object_id] = dict(labels or {})
+        for key, value in self.labels[object_id].items():
+            self.postings.setdefault(key, {}).setdefault(value, set()).add(object_id)
+
+    def remove(self, object_id):
+        for key, value in (self.labels.pop(object_id, None) or {}).items():
+            ids = self.postings[key][value]
+            ids.discard(object_id)
+            if not ids:
+                del self.postings[key][value]
+                if not self.postings[key]:
+                    del self.postings[key]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def lookup(self, key, values=None):
+        """
+        Ids having key with any of values, or key with any value when values is None
+        """
+        by_value = self.postings.get(key) or {}
+        if values is None:
+            values = by_value.keys()
+        found = set()
+        for value in values:
+            found |= by_value.get(value, set())
+        return found
+
+    def with_value(self, value):
+        """
+        Ids having value under any key, the --deploy filter
+        """
+        found = set()
+        for by_value in self.postings.values():
+            found |= by_value.get(value, set())
+        return found
+
+    def select(self, requirements):
+        """
+        Ids matching every requirement. Equality, in and exists requirements are looked up and
+        intersected smallest first, negative ones are then subtracted from the candidates
+        """
+        positive = [r for r in requirements if r[1] not in NEGATIVE]
+        negative = [r for r in requirements if r[1] in NEGATIVE]
+        if positive:
+            found = sorted((self.lookup(key, None if op == EXISTS else values) for key, op, values in positive),
+                           key=len)
+            candidates = set(found[0])
+            for ids in found[1:]:
+                if not candidates:
+                    break
+                candidates &= ids
+        else:
+            candidates = set(self.labels)
+        for key, op, values in negative:
+            if not candidates:
+                break
+            candidates -= self.lookup(key, None if op == NOT_EXISTS else values)
+        return candidates
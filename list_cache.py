@@ -0,0 +1,163 @@
+import json
+import os
+import os.path
+import shutil
+from hashlib import sha1
+from label_index import LabelIndex, get_labels
+from config_json_handler import get_config_dir
+
+CACHE_DIR = "cache"
+
+EXPIRED_CODE = 410
+EXPIRED_ERROR = "expired"
+
+
+def is_expired(tcp_result):
+    """
+    The server answers 410 when it no longer keeps changes since the requested resourceVersion
+    """
+    if not tcp_result:
+        return False
+    if tcp_result.get("code") == EXPIRED_CODE:
+        return True
+    error = tcp_result.get("error")
+    return bool(error) and EXPIRED_ERROR in str(error).lower()
+
+
+def get_cache_dir():
+    return os.path.join(get_config_dir(), CACHE_DIR)
+
+
+def clear_cache():
+    """
+    Removes the snapshots of every server and user, on logout
+    """
+    shutil.rmtree(get_cache_dir(), ignore_errors=True)
+
+
+def get_item_key(item):
+    metadata = item.get("metadata") or {}
+    return metadata.get("uid") or metadata.get("name")
+
+
+class ListCache:
+    """
+    Last list snapshot and its resourceVersion per (namespace, kind) of one server and user.
+    Snapshots hold whole manifests, env values included, so only the owner can read them.
+
+    A list requested with resourceVersion is answered either with a full list ("items")
+    or with changes since that version:
+        {"kind": "PodList", "metadata": {"resourceVersion": "42"},
+         "events": [{"type": "ADDED|MODIFIED|DELETED", "object": {...}}]}
+    """
+    def __init__(self, server, token):
+        # another user logged in to the same server never sees these snapshots
+        identity = '{}\n{}'.format(server, token or "")
+        self.directory = os.path.join(get_cache_dir(), sha1(identity.encode('utf-8')).hexdigest()[:12])
+        self.snapshots = {}
+        self.indexes = {}
+
+    def get_file(self, namespace, kind):
+        return os.path.join(self.directory, namespace, '{}.json'.format(kind))
+
+    def load(self, namespace, kind):
+        key = (namespace, kind)
+        if key not in self.snapshots:
+            try:
+                with open(self.get_file(namespace, kind), 'r', encoding='utf-8') as f:
+                    self.snapshots[key] = json.load(f)
+            except (OSError, ValueError):
+                self.snapshots[key] = None
+        return self.snapshots[key]
+
+    def get_version(self, namespace, kind):
+        snapshot = self.load(namespace, kind)
+        if snapshot:
+            return snapshot.get("resourceVersion")
+
+    def save(self, namespace, kind, snapshot):
+        self.snapshots[(namespace, kind)] = snapshot
+        file_name = self.get_file(namespace, kind)
+        try:
+            os.makedirs(os.path.dirname(file_name), mode=0o700, exist_ok=True)
+            # snapshots of older versions were written with default permissions
+            os.chmod(get_cache_dir(), 0o700)
+            tmp_file_name = '{}.{}'.format(file_name, os.getpid())
+            fd = os.open(tmp_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as w:
+                json.dump(snapshot, w, separators=(',', ':'))
+            os.replace(tmp_file_name, file_name)
+        except OSError:
+            pass
+
+    def drop(self, namespace, kind):
+        self.snapshots[(namespace, kind)] = None
+        self.indexes.pop((namespace, kind), None)
+        try:
+            os.remove(self.get_file(namespace, kind))
+        except OSError:
+            pass
+
+    def forget(self, namespace, kind):
+        """
+        Frees the in memory snapshot once its items are handed out, the file stays and is
+        loaded again when needed
+        """
+        self.snapshots.pop((namespace, kind), None)
+        self.indexes.pop((namespace, kind), None)
+
+    def get_index(self, namespace, kind):
+        """
+        LabelIndex of the snapshot by item key, built on first use and kept up to date
+        by the deltas merged afterwards
+        """
+        snapshot = self.load(namespace, kind)
+        if not snapshot:
+            return None
+        if (namespace, kind) not in self.indexes:
+            index = LabelIndex()
+            for key, item in snapshot["items"].items():
+                index.add(key, get_labels(item))
+            self.indexes[(namespace, kind)] = index
+        return self.indexes[(namespace, kind)]
+
+    def select(self, namespace, kind, requirements):
+        """
+        Items of the snapshot matching label selector requirements, None without a snapshot
+        """
+        index = self.get_index(namespace, kind)
+        if index is None:
+            return None
+        items = self.snapshots[(namespace, kind)]["items"]
+        return [items[key] for key in sorted(index.select(requirements))]
+
+    def merge(self, namespace, kind, data):
+        """
+        Applies a full list or a delta to the snapshot and returns the full list data
+        """
+        version = (data.get("metadata") or {}).get("resourceVersion")
+        if "events" in data:
+            snapshot = self.load(namespace, kind) or {"kind": data.get("kind"), "items": {}}
+            items = snapshot["items"]
+            index = self.indexes.get((namespace, kind))
+            for event in data.get("events") or []:
+                item = event.get("object") or {}
+                if event.get("type") == "DELETED":
+                    items.pop(get_item_key(item), None)
+                    if index is not None:
+                        index.remove(get_item_key(item))
+                else:
+                    items[get_item_key(item)] = item
+                    if index is not None:
+                        index.add(get_item_key(item), get_labels(item))
+        else:
+            items = {get_item_key(item): item for item in data.get("items") or []}
+            self.indexes.pop((namespace, kind), None)
+        if version:
+            self.save(namespace, kind, {"kind": data.get("kind"), "resourceVersion": version, "items": items})
+        else:
+            self.drop(namespace, kind)
+
+        result = {key: value for key, value in data.items() if key != "events"}
+        result["items"] = list(items.values())
+        return result
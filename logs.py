@@ -0,0 +1,81 @@
+import re
+import sys
+import threading
+from queue import Queue
+from bcolors import BColors
+
+CHUNK_SIZE = 4096
+QUEUE_SIZE = 256
+
+SINCE_REGEX = re.compile(r"^(?P<value>\d+)(?P<unit>[smhd]?)$")
+SINCE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+SINCE_ERROR = "Since must be duration, for example 30s, 10m or 2h"
+
+PREFIX_COLORS = [
+    BColors.OKBLUE,
+    BColors.OKGREEN,
+    BColors.WARNING,
+    BColors.HEADER,
+]
+
+_END = object()
+
+
+def parse_since(since):
+    if not since:
+        return None
+    match = SINCE_REGEX.match(since.strip())
+    if not match:
+        raise ValueError(SINCE_ERROR)
+    return int(match.group("value")) * SINCE_UNITS[match.group("unit")]
+
+
+def get_output():
+    return getattr(sys.stdout, "buffer", sys.stdout)
+
+
+def write_stream(response, output=None):
+    """
+    Copies a chunked log response to output line by line, only one chunk is held in memory
+    """
+    output = output or get_output()
+    try:
+        for line in response.iter_lines(chunk_size=CHUNK_SIZE):
+            output.write(line + b"\n")
+            output.flush()
+    finally:
+        response.close()
+
+
+def write_merged_streams(responses, output=None):
+    """
+    Merges several log responses into output, every line is prefixed with its pod name.
+    Readers block on a bounded queue when output is slower than the pods produce logs
+    """
+    output = output or get_output()
+    lines = Queue(maxsize=QUEUE_SIZE)
+    width = max(len(name) for name in responses)
+
+    def read(name, response, color):
+        prefix = "{}{:<{}}{} | ".format(color, name, width, BColors.ENDC).encode("utf-8")
+        try:
+            for line in response.iter_lines(chunk_size=CHUNK_SIZE):
+                lines.put(prefix + line + b"\n")
+        except Exception as e:
+            lines.put(prefix + "{}{}{}\n".format(BColors.FAIL, e, BColors.ENDC).encode("utf-8"))
+        finally:
+            response.close()
+            lines.put(_END)
+
+    for number, (name, response) in enumerate(sorted(responses.items())):
+        color = PREFIX_COLORS[number % len(PREFIX_COLORS)]
+        threading.Thread(target=read, args=(name, response, color), daemon=True).start()
+
+    running = len(responses)
+    while running:
+        line = lines.get()
+        if line is _END:
+            running -= 1
+            continue
+        output.write(line)
+        output.flush()
@@ -0,0 +1,127 @@
+import json
+
+MERGE_PATCH_CONTENT_TYPE = "application/merge-patch+json"
+
+
+def merge_patch(live, local):
+    """
+    Returns a json merge patch (RFC 7386) that makes live match local for every field local sets,
+    fields only the live object has (server defaults, status) are left alone, explicit nulls
+    in local remove fields. Lists of named items are compared item by item, other lists
+    as a whole, a list that differs is sent whole. Returns {} when nothing changes
+    """
+    patch = {}
+    for key, value in local.items():
+        if value is None:
+            if key in live:
+                patch[key] = None
+            continue
+        live_value = live.get(key)
+        if isinstance(value, dict) and isinstance(live_value, dict):
+            nested = merge_patch(live_value, value)
+            if nested:
+                patch[key] = nested
+        elif is_named_list(value) and is_named_list(live_value):
+            merged = merge_named_list(live_value, value)
+            if merged is not None:
+                patch[key] = merged
+        elif value != live_value:
+            patch[key] = value
+    return patch
+
+
+def merge_named_list(live, local):
+    """
+    Items (containers, env, ports) are matched by name and compared only on the fields local
+    sets, the fields the server filled in (resources, imagePullPolicy) do not count. Returns None
+    when the lists match, otherwise the list to send: local items on top of their live ones,
+    so a merge patch replacing the list keeps the server filled fields
+    """
+    live_items = {i["name"]: i for i in live}
+    changed = [i["name"] for i in live] != [i["name"] for i in local]
+    merged = []
+    for item in local:
+        live_item = live_items.get(item["name"])
+        if live_item is None:
+            merged.append(item)
+            continue
+        item_patch = merge_patch(live_item, item)
+        changed = changed or bool(item_patch)
+        merged.append(apply_merge_patch(live_item, item_patch))
+    return merged if changed else None
+
+
+def apply_merge_patch(target, patch):
+    """
+    Returns target with patch applied, target is not modified
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def iter_changes(live, patch, path=""):
+    """
+    Yields (sign, path, old, new) for every leaf of patch: + added, - removed, ~ changed
+    """
+    for key in sorted(patch):
+        value = patch[key]
+        key_path = '{}.{}'.format(path, key) if path else key
+        old = live.get(key) if isinstance(live, dict) else None
+        if value is None:
+            yield '-', key_path, old, None
+        elif isinstance(value, dict) and isinstance(old, dict):
+            yield from iter_changes(old, value, key_path)
+        elif is_named_list(value) and is_named_list(old):
+            yield from iter_named_list_changes(old, value, key_path)
+        elif old is None:
+            yield '+', key_path, None, value
+        else:
+            yield '~', key_path, old, value
+
+
+def is_named_list(value):
+    return isinstance(value, list) and all(isinstance(i, dict) and "name" in i for i in value)
+
+
+def iter_named_list_changes(old, new, path):
+    """
+    Lists of named items (containers, env, ports) are shown item by item, they are still sent whole
+    """
+    old_items = {i["name"]: i for i in old}
+    new_items = {i["name"]: i for i in new}
+    common = [name for name in new_items if name in old_items]
+    if [name for name in old_items if name in new_items] != common:
+        yield '~', '{}[]'.format(path), [name for name in old_items if name in new_items], common
+    for name, item in new_items.items():
+        item_path = '{}[{}]'.format(path, name)
+        if name not in old_items:
+            yield '+', item_path, None, item
+        else:
+            removed = {key: None for key in old_items[name] if key not in item}
+            yield from iter_changes(old_items[name], dict(merge_patch(old_items[name], item), **removed), item_path)
+    for name, item in old_items.items():
+        if name not in new_items:
+            yield '-', '{}[{}]'.format(path, name), item, None
+
+
+def format_value(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def format_changes(live, patch):
+    lines = []
+    for sign, path, old, new in iter_changes(live, patch):
+        if sign == '+':
+            lines.append('+ {}: {}'.format(path, format_value(new)))
+        elif sign == '-':
+            lines.append('- {}: {}'.format(path, format_value(old)))
+        else:
+            lines.append('~ {}: {} -> {}'.format(path, format_value(old), format_value(new)))
+    return lines
@@ -0,0 +1,135 @@
+import copy
+import itertools
+from datetime import datetime
+from hashlib import sha256, md5
+from data import deployment_json, service_json
+
+MATRIX_ERROR = "Matrix must be a mapping of parameter lists or a list of parameter rows"
+MATRIX_KEYS = ("image", "ports", "labels", "env", "cpu", "memory", "replicas", "commands")
+
+
+def parse_pairs(pairs):
+    """
+    Accepts {"KEY": "VALUE"} or ["KEY=VALUE", ...] and returns a new dict
+    """
+    if not pairs:
+        return {}
+    if isinstance(pairs, dict):
+        return {str(key): str(value) for key, value in pairs.items()}
+    result = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        result[key] = value
+    return result
+
+
+def build_deployment(name, image, ports=None, labels=None, env=None, cpu="100m", memory="128Mi",
+                     replicas=1, commands=None):
+    """
+    Returns a new deployment manifest, the template from data.py is never modified
+    """
+    manifest = copy.deepcopy(deployment_json)
+    labels = parse_pairs(labels)
+    env = parse_pairs(env)
+    container = manifest['spec']['template']['spec']['containers'][0]
+
+    manifest['metadata']['name'] = name
+    manifest['spec']['replicas'] = replicas
+    container['name'] = name
+    container['image'] = image
+    if commands:
+        container['command'] = list(commands)
+    if ports:
+        container['ports'] = [{'containerPort': int(port)} for port in ports]
+    if labels:
+        manifest['metadata']['labels'].update(labels)
+        manifest['spec']['template']['metadata']['labels'].update(labels)
+    if env:
+        container['env'] = [
+            {
+                "name": key,
+                "value": value
+            }
+            for key, value in env.items()]
+    container['resources']["requests"]['cpu'] = cpu
+    container['resources']["requests"]['memory'] = memory
+    return manifest
+
+
+def parse_service_port(port):
+    """
+    PORTNAME:TARGETPORT[:PROTOCOL] for external, PORTNAME:TARGETPORT:PORT[:PROTOCOL] for internal ports,
+    returns (port dict, is_external)
+    """
+    p = port.split(":")
+    if len(p) == 3:
+        if p[2].upper() == "TCP" or p[2].upper() == "UDP":
+            return {"name": p[0], "protocol": p[2].upper(), "targetPort": int(p[1])}, True
+        return {"name": p[0], "protocol": "TCP", "port": int(p[2]), "targetPort": int(p[1])}, False
+    if len(p) == 4:
+        return {"name": p[0], "port": int(p[2]), "protocol": p[3].upper(), "targetPort": int(p[1])}, False
+    if len(p) == 2:
+        return {"name": p[0], "protocol": "TCP", "targetPort": int(p[1])}, True
+    raise ValueError("bad port: {}".format(port))
+
+
+def build_service(name, ports, selector):
+    """
+    Returns a new service manifest for ports given as expose PORTS strings
+    """
+    manifest = copy.deepcopy(service_json)
+    is_external = "true"
+    for port in ports or []:
+        port, external = parse_service_port(port)
+        manifest["spec"]["ports"].append(port)
+        if not external:
+            is_external = "false"
+    manifest["metadata"]["name"] = name
+    manifest["metadata"]["labels"].update(selector)
+    manifest["metadata"]["labels"].update({"external": is_external})
+    manifest["spec"]["selector"].update(selector)
+    return manifest
+
+
+def build_expose(deployment, namespace, ports):
+    """
+    Returns a new service manifest for deployment, named after it with a unique suffix
+    and selecting its pods by the namespace label
+    """
+    selector = {sha256(namespace.encode('utf-8')).hexdigest()[:32]: deployment}
+    name = deployment + "-" + md5((deployment + str(datetime.now())).encode("utf-8")).hexdigest()[:4]
+    return build_service(name, ports, selector)
+
+
+def expand_matrix(matrix):
+    """
+    Turns {"image": [...], "replicas": [...]} into the product of all values,
+    a list of rows is returned as is
+    """
+    if isinstance(matrix, list):
+        rows = matrix
+    elif isinstance(matrix, dict):
+        keys = list(matrix)
+        values = [v if isinstance(v, list) else [v] for v in matrix.values()]
+        rows = [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+    else:
+        raise ValueError(MATRIX_ERROR)
+    for row in rows:
+        if not isinstance(row, dict) or set(row) - set(MATRIX_KEYS):
+            raise ValueError(MATRIX_ERROR)
+    return rows
+
+
+def build_matrix(name, matrix, **defaults):
+    """
+    Builds one deployment per matrix row, named NAME-1, NAME-2, ...
+    """
+    manifests = []
+    for number, row in enumerate(expand_matrix(matrix), 1):
+        params = dict(defaults)
+        for key, value in row.items():
+            if key in ("labels", "env"):
+                value = dict(parse_pairs(params.get(key)), **parse_pairs(value))
+            params[key] = value
+        manifests.append(build_deployment('{}-{}'.format(name, number), **params))
+    return manifests
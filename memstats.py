@@ -0,0 +1,147 @@
+import contextlib
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from bcolors import BColors
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PHASES = ("receive", "decode", "transform", "render")
+TOP_SITES = 10
+SIZE_UNITS = {"": 1, "k": 1000, "ki": 1024, "m": 1000 ** 2, "mi": 1024 ** 2, "g": 1000 ** 3, "gi": 1024 ** 3}
+SIZE_ERROR = "memory budget should be a size like 64Mi, 100M or 1Gi"
+VERSION_ERROR = "--memstats needs python 3.9 or newer"
+
+_stats = None
+
+
+def is_supported():
+    # per phase peaks need tracemalloc.reset_peak
+    return hasattr(tracemalloc, "reset_peak")
+
+
+def start():
+    global _stats
+    _stats = MemStats()
+    return _stats
+
+
+def get_stats():
+    return _stats
+
+
+def phase(name):
+    """
+    Accounts the block to phase name when --memstats is on, does nothing otherwise
+    """
+    return _stats.phase(name) if _stats else no_phase()
+
+
+@contextlib.contextmanager
+def no_phase():
+    yield
+
+
+def parse_size(size):
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([kmg]i?)?b?$', str(size).strip().lower())
+    if not match:
+        raise ValueError(SIZE_ERROR)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) or ""])
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return '{:.1f}{}'.format(size, unit) if unit != "B" else '{}B'.format(size)
+        size /= 1024
+    return '{:.1f}GiB'.format(size)
+
+
+def get_peak_rss():
+    """
+    Peak resident memory of the process in bytes, None where getrusage is missing
+    """
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def over_budget(budget):
+    """
+    True when the process already used more than budget bytes, renderers then stream
+    instead of building the whole output in memory
+    """
+    if not budget:
+        return False
+    peak = get_peak_rss()
+    if peak is None and tracemalloc.is_tracing():
+        peak = tracemalloc.get_traced_memory()[1]
+    return peak is not None and peak > budget
+
+
+class MemStats:
+    """
+    Traces python allocations and sums them per phase: peak is the highest memory above
+    the phase start, retained is what the phase left allocated. Phases running in worker
+    threads at the same time share the peak, so their numbers are approximate
+    """
+    def __init__(self):
+        tracemalloc.start()
+        self.phases = {}
+        self.sites = Counter()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        before = self.snapshot()
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            after = self.snapshot()
+            with self.lock:
+                stats = self.phases.setdefault(name, {"calls": 0, "peak": 0, "retained": 0})
+                stats["calls"] += 1
+                stats["peak"] = max(stats["peak"], peak - start)
+                stats["retained"] += current - start
+                for diff in after.compare_to(before, 'lineno'):
+                    if diff.size_diff > 0:
+                        self.sites[str(diff.traceback[0])] += diff.size_diff
+
+    @staticmethod
+    def snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    def report(self, out=sys.stderr):
+        """
+        Printed to stderr so it does not mix with json or yaml output
+        """
+        print('{}memory by phase:{}'.format(BColors.OKBLUE, BColors.ENDC), file=out)
+        for name in PHASES + tuple(sorted(set(self.phases) - set(PHASES))):
+            stats = self.phases.get(name)
+            if stats:
+                print('  {:<10} calls {:<4} peak {:>10}  retained {:>10}'.format(
+                    name, stats["calls"], format_size(stats["peak"]), format_size(stats["retained"])), file=out)
+        current, _ = tracemalloc.get_traced_memory()
+        print('  traced now {}'.format(format_size(current)), file=out)
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            print('  process peak rss {}'.format(format_size(peak_rss)), file=out)
+        if self.sites:
+            print('{}top allocation sites retained by phases:{}'.format(BColors.OKBLUE, BColors.ENDC), file=out)
+            for site, size in self.sites.most_common(TOP_SITES):
+                print('  {:>10}  {}'.format(format_size(size), site), file=out)
@@ -0,0 +1,190 @@
+import heapq
+import sys
+from datetime import datetime
+from dateutil import parser
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_timestamp(timestamp):
+    if not timestamp:
+        return None
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except ValueError:
+        return parser.parse(timestamp).replace(tzinfo=None)
+
+
+def intern_labels(labels):
+    if not labels:
+        return {}
+    return {sys.intern(str(key)): sys.intern(str(value)) for key, value in labels.items()}
+
+
+def intern_str(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """
+    Base of compact records built from decoded api objects, only the fields chkit
+    renders or filters on are kept
+    """
+    __slots__ = ("name", "namespace", "labels", "created", "context")
+
+    def __init__(self, metadata, context=None):
+        metadata = metadata or {}
+        self.context = context
+        self.name = metadata.get("name")
+        self.namespace = intern_str(metadata.get("namespace"))
+        self.labels = intern_labels(metadata.get("labels"))
+        self.created = parse_timestamp(metadata.get("creationTimestamp"))
+
+    def __repr__(self):
+        return '{}({!r}, namespace={!r})'.format(type(self).__name__, self.name, self.namespace)
+
+
+class Container:
+    __slots__ = ("name", "image", "cpu", "memory")
+
+    def __init__(self, data):
+        limits = (data.get("resources") or {}).get("limits") or {}
+        self.name = data.get("name")
+        self.image = intern_str(data.get("image"))
+        self.cpu = intern_str(limits.get("cpu"))
+        self.memory = intern_str(limits.get("memory"))
+
+    def __repr__(self):
+        return 'Container({!r}, image={!r})'.format(self.name, self.image)
+
+
+class Pod(Record):
+    __slots__ = ("phase", "ip", "restarts", "ready", "containers_count")
+
+    def __init__(self, data):
+        Record.__init__(self, data.get("metadata"), data.get("context"))
+        status = data.get("status") or {}
+        statuses = status.get("containerStatuses") or []
+        self.phase = intern_str(status.get("phase"))
+        self.ip = status.get("podIP")
+        self.restarts = sum(s.get("restartCount") or 0 for s in statuses) if statuses else None
+        self.ready = sum(1 for s in statuses if s.get("ready"))
+        self.containers_count = len(statuses) or len((data.get("spec") or {}).get("containers") or [])
+
+    @property
+    def is_ready(self):
+        return self.phase == "Running" and self.containers_count > 0 and self.ready == self.containers_count
+
+
+class Deployment(Record):
+    __slots__ = ("replicas", "available_replicas", "updated_replicas", "selector", "containers")
+
+    def __init__(self, data):
+        Record.__init__(self, data.get("metadata"), data.get("context"))
+        spec = data.get("spec") or {}
+        status = data.get("status") or {}
+        self.replicas = spec.get("replicas")
+        self.available_replicas = status.get("availableReplicas") or 0
+        self.updated_replicas = status.get("updatedReplicas") or 0
+        self.selector = intern_labels((spec.get("selector") or {}).get("matchLabels"))
+        template_spec = (spec.get("template") or {}).get("spec") or {}
+        self.containers = tuple(Container(c) for c in template_spec.get("containers") or [])
+
+
+class ServicePort:
+    __slots__ = ("name", "port", "target_port", "protocol")
+
+    def __init__(self, data):
+        self.name = data.get("name")
+        self.port = data.get("port")
+        self.target_port = data.get("targetPort")
+        self.protocol = intern_str(data.get("protocol"))
+
+    def __str__(self):
+        if self.port == self.target_port:
+            return "%s/%s" % (self.port, self.protocol)
+        return "%s:%s/%s" % (self.port, self.target_port, self.protocol)
+
+
+class Service(Record):
+    __slots__ = ("cluster_ip", "domain_hosts", "ports", "selector")
+
+    def __init__(self, data):
+        Record.__init__(self, data.get("metadata"), data.get("context"))
+        spec = data.get("spec") or {}
+        self.cluster_ip = spec.get("clusterIP")
+        self.domain_hosts = tuple(spec.get("domainHosts") or ())
+        self.ports = tuple(ServicePort(p) for p in spec.get("ports") or [])
+        self.selector = intern_labels(spec.get("selector"))
+
+    @property
+    def is_external(self):
+        return self.labels.get("external")
+
+
+class Namespace(Record):
+    __slots__ = ("phase",)
+
+    def __init__(self, data):
+        Record.__init__(self, data.get("metadata"), data.get("context"))
+        self.phase = intern_str((data.get("status") or {}).get("phase"))
+
+
+class ResourceQuota(Record):
+    __slots__ = ("hard", "used")
+
+    def __init__(self, data):
+        Record.__init__(self, data.get("metadata"), data.get("context"))
+        status = data.get("status") or {}
+        self.hard = dict(status.get("hard") or {})
+        self.used = dict(status.get("used") or {})
+
+
+RECORDS = {
+    "Pod": Pod,
+    "PodList": Pod,
+    "Deployment": Deployment,
+    "DeploymentList": Deployment,
+    "Service": Service,
+    "ServiceList": Service,
+    "Namespace": Namespace,
+    "ResourceQuota": ResourceQuota,
+}
+
+
+def from_json(data, kind=None):
+    return RECORDS[kind or data.get("kind")](data)
+
+
+def from_list(data):
+    """
+    Builds records for every item of a decoded *List object
+    """
+    record = RECORDS[data.get("kind")]
+    return [record(item) for item in data.get("items") or []]
+
+
+def take_list(data):
+    """
+    Like from_list, but takes the items out of data while building their records, so every
+    decoded item is freed as soon as its record exists unless something else still holds it
+    """
+    record = RECORDS[data.get("kind")]
+    items = data.get("items") or []
+    items.reverse()
+    records = []
+    while items:
+        records.append(record(items.pop()))
+    return records
+
+
+def get_created(item):
+    return parse_timestamp((item.get("metadata") or {}).get("creationTimestamp")) or datetime.min
+
+
+def merge_by_created(item_lists):
+    """
+    k-way merge of decoded items from several lists by creation time,
+    every list is sorted on its own and the results are merged, not re-sorted
+    """
+    return list(heapq.merge(*(sorted(items, key=get_created) for items in item_lists), key=get_created))
@@ -1,12 +1,22 @@
 import argparse
 import argcomplete
 from data import kinds, output_formats, run_kinds, delete_kinds, expose_kinds, fields
+from bulk import MAX_WORKERS
+from rolling_restart import DEFAULT_WAVE, DEFAULT_TIMEOUT
+from wait import DEFAULT_TIMEOUT as DEFAULT_WAIT_TIMEOUT
+from completion_index import ResourceCompleter
 
 
 ONE_REQUIRED_ARGUMENT_ERROR = "you should pass at least one required argument: KIND or FILE"
 KIND_OR_FILE_BOTH_ERROR = "you should pass either KIND, or FILE, not both"
 NAME_OR_FILE_BOTH_ERROR = "you should pass either NAME, or FILE, not both"
 NAME_WITH_KIND_ERROR = "NAME is required with KIND argument"
+POD_OR_DEPLOY_ERROR = "you should pass either POD, or --deploy DEPLOY"
+RECORD_OR_REPLAY_ERROR = "you should pass either --record, or --replay, not both"
+ADD_CONTEXT_ERROR = "--add-context requires --server and --tcp-address"
+CONTEXT_COMMANDS_ERROR = "--context and --all-contexts work with get, scale and set"
+SUM_WITHOUT_GROUP_ERROR = "--sum works with --group-by"
+QUERY_LIST_ERROR = "--where, --sort-by and --group-by work with lists of pods, deployments and services"
 
 formatter_class=lambda prog: MyFormatter(prog, max_help_position=80, width=140)
 
@@ -17,13 +27,34 @@ def create_parser(version):
 
     parser.add_argument('--version', action='version', version='%(prog)s {}'.format(version))
     parser.add_argument("-d", '--debug', action='store_true', default=False, help='print debug messages to stdout')
+    parser.add_argument('--record', help='record api and tcp traffic to session FILE', metavar="FILE")
+    parser.add_argument('--replay', help='serve api and tcp traffic from recorded session FILE, no network',
+                        metavar="FILE")
+    parser.add_argument('--replay-speed', help='0 - as fast as possible (default), 1 - original timing, '
+                                               '2 - twice as fast', type=float, default=0, metavar="SPEED")
+    parser.add_argument('--memstats', help='print peak and retained memory per phase to stderr at exit',
+                        action='store_true', default=False)
+    parser.add_argument('--memory-budget', help='stream output instead of building it in memory once the process '
+                                                'used more than SIZE, for example 64Mi', metavar="SIZE")
+    parser.add_argument('--context', help='run get, scale or set against contexts NAME[,NAME...] concurrently',
+                        metavar="CONTEXTS")
+    parser.add_argument('--all-contexts', help='run get, scale or set against every context', action='store_true',
+                        default=False)
     subparsers = parser.add_subparsers(help='use «[COMMAND] --help» to get detailed help for the command',  dest='command')
 
     config_description = "Show and changing user's config settings"
-    config_usg = 'chkit [--debug -d ] config (--set-token -t TOKEN  | --set-default-namespace -n NAMESPACE )[-h | --help]'
+    config_usg = 'chkit [--debug -d ] config (--set-token -t TOKEN  | --set-default-namespace -n NAMESPACE | ' \
+                 '--use-context NAME | --add-context NAME --server SERVER --tcp-address HOST:PORT [--token TOKEN])' \
+                 '[-h | --help]'
     parser_config = subparsers.add_parser('config', help=config_usg, usage=config_usg, description=config_description, formatter_class=formatter_class)
     parser_config.add_argument('--set-token', '-t', help='token', required=False)
-    parser_config.add_argument('--set-default-namespace', '-n', help='default namespace', required=False)
+    parser_config.add_argument('--set-default-namespace', '-n', help='default namespace', required=False).completer = ResourceCompleter('namespaces')
+    parser_config.add_argument('--use-context', help='context used without --context, "" for the main server',
+                               metavar="NAME", required=False)
+    parser_config.add_argument('--add-context', help='add or change context', metavar="NAME", required=False)
+    parser_config.add_argument('--server', help='api server of context, for example http://host:3333', required=False)
+    parser_config.add_argument('--tcp-address', help='tcp channel of context, HOST:PORT', required=False)
+    parser_config.add_argument('--token', help='token of context, default: main token', required=False)
 
     run_description = "Running deployement genereting json file"
     run_usg = 'chkit [--debug -d ] run  NAME --configure | --image -i IMAGE '\
@@ -35,6 +66,7 @@ def create_parser(version):
                                                    '[--command -cmd COMMAND] '\
                                                    '[--labels -ls "KEY=VALUE"]'\
                                                    '[--namespace -n NAMESPACE]'\
+                                                   '[--matrix FILE [--workers -w WORKERS]]'\
                                                    '[-h  --help]'
     parser_run = subparsers.add_parser('run', help=run_usg, usage=run_usg, description=run_description, formatter_class=formatter_class)
     parser_run._optionals.title = 'run arguments'
@@ -48,8 +80,12 @@ def create_parser(version):
                             required=False)
     parser_run.add_argument('--memory', '-m', help='memory, default: 128Mi', default="128Mi", required=False)
     parser_run.add_argument('--cpu', '-c', help='CPU share, default: 100m, ', default="100m", required=False)
-    parser_run.add_argument('--namespace', '-n', help='namespace, default \"default\"', required=False)
+    parser_run.add_argument('--namespace', '-n', help='namespace, default \"default\"', required=False).completer = ResourceCompleter('namespaces')
     parser_run.add_argument('--configure', action='store_true', default=False, help='input params in console')
+    parser_run.add_argument('--matrix', help='json or yaml file with parameter lists (image, env, replicas, ...), '
+                                             'runs NAME-1..NAME-N for every combination', required=False)
+    parser_run.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                            default=MAX_WORKERS, required=False)
 
     create_usg = "chkit [--debug -d ] create (--file -f FILE)[-h --help]"
     create_description = "Creating deployment from json file"
@@ -62,46 +98,78 @@ def create_parser(version):
     parser_expose = subparsers.add_parser('expose', help=expose_usg, usage=expose_usg, description=expose_description,
                                           formatter_class=formatter_class)
     parser_expose.add_argument('kind', help='{deployment} object kind', choices=expose_kinds, metavar="KIND")
-    parser_expose.add_argument('name', help='object name to get info', nargs='?', metavar="NAME")
+    parser_expose.add_argument('name', help='object name to get info', nargs='?', metavar="NAME").completer = ResourceCompleter('deployments')
     parser_expose.add_argument('--ports', '-p', help='target port, for external services PORTS = PORTNAME:TARGETPORT[:PROTOCOL],'
                                                      ' for internal services '
                                                      'PORTS = PORTNAME:TARGETPORT:PORT[:PROTOCOL]'
                                                      ' default: PROTOCOL = TCP', nargs='*', required=True)
-    parser_expose.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False)
+    parser_expose.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
 
-    set_usg = 'chkit [--debug -d] set FIELD TYPE NAME CONTAINER_NAME=CONTAINER_IMAGE|COUNT [-n --namespace NAMESPACE][--help | -h]'
+    set_usg = 'chkit [--debug -d] set FIELD TYPE (NAME [NAME ...] | --selector -l SELECTOR) ' \
+              'CONTAINER_NAME=CONTAINER_IMAGE|COUNT [-n --namespace NAMESPACE][--workers -w WORKERS][--help | -h]'
     set_description = 'Change image in containers | set replicas count'
     parser_set = subparsers.add_parser('set', help=set_usg, usage=set_usg, description=set_description,
                                        formatter_class=formatter_class)
     parser_set._optionals.title = 'set arguments'
     parser_set.add_argument('field', help='{image} spec field', choices=fields, metavar="FIELD")
     parser_set.add_argument('kind', help='{deployment} object kind', choices=run_kinds, metavar="KIND")
-    parser_set.add_argument('name', help='object name to get info', metavar="NAME", nargs='+')
-    parser_set.add_argument('args', help='pair of container and image|count of replicas', metavar="ARGS", nargs='+')
+    parser_set.add_argument('name', help='deployment names', metavar="NAME", nargs='*').completer = ResourceCompleter('deployments')
+    parser_set.add_argument('args', help='pair of container and image|count of replicas (N, +N, -N, xN, N%%)',
+                            metavar="ARGS")
     #parser_set.add_argument('--file', '-f', help='input file')
-    parser_set.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False)
+    parser_set.add_argument('--selector', '-l', help='label selector: KEY=VALUE, KEY!=VALUE, "KEY in (A,B)", '
+                                                     '"KEY notin (A,B)", KEY, !KEY, comma separated', required=False)
+    parser_set.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
+    parser_set.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                            default=MAX_WORKERS, required=False)
 
     get_usg = 'chkit [--debug -d ] get (KIND [NAME] | --file -f FILE) ' \
-              '[--output -o OUTPUT] [--namespace -n NAMESPACE][--deploy -d DEPLOY][-h | --help]'
+              '[--output -o OUTPUT] [--namespace -n NAMESPACE | --all-namespaces -A [--workers -w WORKERS]]' \
+              '[--deploy -d DEPLOY][--where CONDITION ...][--sort-by FIELD[:desc]][--group-by FIELD [--sum FIELD ...]]' \
+              '[-h | --help]'
     get_description = "Show info about pod(s), service(s), namespace(s), deployment(s)"
     parser_get = subparsers.add_parser('get', help=get_usg, usage=get_usg, description=get_description,
                                        formatter_class=formatter_class)
     parser_get._optionals.title = 'get arguments'
     parser_get.add_argument('kind', help='{namespace,deployment,service,pod} object kind', choices=kinds, default="", metavar="KIND", nargs='?')
-    parser_get.add_argument('name', help='object name to get info', metavar="NAME", nargs='?')
+    parser_get.add_argument('name', help='object name to get info', metavar="NAME", nargs='?').completer = ResourceCompleter()
     parser_get.add_argument('--file', '-f', help='input file')
     parser_get.add_argument('--output', '-o', help='{yaml,json} output format, default: json', choices=output_formats, metavar="OUTPUT")
-    parser_get.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False)
+    parser_get.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
     parser_get.add_argument('--deploy', '-d', help='filtering by deploy(only for pods ans services!)', required=False)
+    parser_get.add_argument('--relist', help='fetch the full list instead of changes since the cached one',
+                            action='store_true', default=False)
+    parser_get.add_argument('--all-namespaces', '-A', help='list objects of every namespace', action='store_true',
+                            default=False)
+    parser_get.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                            default=MAX_WORKERS, required=False)
+    parser_get.add_argument('--where', help='keep list items matching FIELD==VALUE, !=, >, >=, <, <= or =~REGEX, '
+                                            'FIELD is .path.to.field, label:KEY or an alias like phase, restarts',
+                            action='append', metavar="CONDITION")
+    parser_get.add_argument('--sort-by', help='sort list items by FIELD, FIELD:desc for descending', metavar="FIELD")
+    parser_get.add_argument('--group-by', help='count list items per value of FIELD', metavar="FIELD")
+    parser_get.add_argument('--sum', help='sum FIELD in every group of --group-by', action='append', metavar="FIELD")
 
-    restart_usg = 'chkit [--debug -d ] restart NAME [--namespace NAMESPACE][-h | --help]'
-    restart_description = "Restarting pods by deploy name"
+    restart_usg = 'chkit [--debug -d ] restart NAME [NAME ...] [--wave WAVE][--parallel -p PARALLEL]' \
+                  '[--budget BUDGET][--timeout TIMEOUT][--all-pods][--namespace NAMESPACE][-h | --help]'
+    restart_description = "Restarting pods by deploy name in waves"
     parser_restart = subparsers.add_parser('restart', help=restart_usg, usage=restart_usg,
                                            description=restart_description,
                                            formatter_class=formatter_class)
     parser_restart._optionals.title = 'restart arguments'
-    parser_restart.add_argument('name', help='deploy name to restart', metavar="NAME")
-    parser_restart.add_argument('--namespace', '-n', help='namespace, optional', required=False)
+    parser_restart.add_argument('name', help='deploy names to restart', metavar="NAME", nargs='+').completer = ResourceCompleter('deployments')
+    parser_restart.add_argument('--wave', help='pods restarted at once per deploy, count or percent, '
+                                               'default: {}'.format(DEFAULT_WAVE.replace('%', '%%')),
+                                default=DEFAULT_WAVE, required=False)
+    parser_restart.add_argument('--parallel', '-p', help='deploys restarted in parallel, default: {}'.format(MAX_WORKERS),
+                                type=int, default=MAX_WORKERS, required=False)
+    parser_restart.add_argument('--budget', help='max pods restarted at once across all deploys', type=int,
+                                required=False)
+    parser_restart.add_argument('--timeout', help='seconds to wait for each wave, default: {}'.format(DEFAULT_TIMEOUT),
+                                type=int, default=DEFAULT_TIMEOUT, required=False)
+    parser_restart.add_argument('--all-pods', action='store_true', default=False,
+                                help='delete all pods of the deploy at once')
+    parser_restart.add_argument('--namespace', '-n', help='namespace, optional', required=False).completer = ResourceCompleter('namespaces')
 
     delete_usg = 'chkit [--debug -d ] delete (KIND NAME | --file -f FILE) [--pods][--namespace NAMESPACE][-h | --help]'
     delete_description = "Deleting pods,service,deployments by name"
@@ -109,14 +177,31 @@ def create_parser(version):
                                           formatter_class=formatter_class)
     parser_delete._optionals.title = 'delete arguments'
     parser_delete.add_argument('kind', help='{deployment,service,pod} object kind', nargs="?", choices=delete_kinds, metavar="KIND")
-    parser_delete.add_argument('name', help='object name to delete', metavar="NAME", nargs="?")
+    parser_delete.add_argument('name', help='object name to delete', metavar="NAME", nargs="?").completer = ResourceCompleter()
     parser_delete.add_argument('--file', '-f', help='input file')
     parser_delete.add_argument('--pods', action='store_true', default=False, help='delete all pods in deploy')
-    parser_delete.add_argument('--namespace', '-n', help='namespace, optional', required=False)
+    parser_delete.add_argument('--namespace', '-n', help='namespace, optional', required=False).completer = ResourceCompleter('namespaces')
 
-    # parser_replace = subparsers.add_parser('replace', help='replace object')
-    # parser_replace.add_argument('--file', '-f', help='input file', required=True)
-    # parser_replace.add_argument('--namespace', help='namespace, optional', required=False)
+    replace_usg = 'chkit [--debug -d] replace --file -f FILE [--namespace -n NAMESPACE][-h | --help]'
+    replace_description = "Update object from file, only changed fields are sent"
+    parser_replace = subparsers.add_parser('replace', help=replace_usg, usage=replace_usg,
+                                           description=replace_description, formatter_class=formatter_class)
+    parser_replace.add_argument('--file', '-f', help='input file', required=True)
+    parser_replace.add_argument('--namespace', '-n', help='namespace, optional', required=False).completer = ResourceCompleter('namespaces')
+
+    apply_usg = 'chkit [--debug -d] apply --file -f FILE [--namespace -n NAMESPACE][-h | --help]'
+    apply_description = "Create object from file or update it, only changed fields are sent"
+    parser_apply = subparsers.add_parser('apply', help=apply_usg, usage=apply_usg, description=apply_description,
+                                         formatter_class=formatter_class)
+    parser_apply.add_argument('--file', '-f', help='input file', required=True)
+    parser_apply.add_argument('--namespace', '-n', help='namespace, optional', required=False).completer = ResourceCompleter('namespaces')
+
+    diff_usg = 'chkit [--debug -d] diff --file -f FILE [--namespace -n NAMESPACE][-h | --help]'
+    diff_description = "Show fields of live object that differ from file, exit code 1 when they differ"
+    parser_diff = subparsers.add_parser('diff', help=diff_usg, usage=diff_usg, description=diff_description,
+                                        formatter_class=formatter_class)
+    parser_diff.add_argument('--file', '-f', help='input file', required=True)
+    parser_diff.add_argument('--namespace', '-n', help='namespace, optional', required=False).completer = ResourceCompleter('namespaces')
 
     login_usg = 'chkit login'
     login_description = "Sign in. Sets user's token to config"
@@ -128,15 +213,74 @@ def create_parser(version):
     parser_logout = subparsers.add_parser('logout', help=logout_usg, usage=logout_usg, description=logout_description,
                                           formatter_class=formatter_class)
 
-    scale_usg = 'chkit [--debug -d] scale KIND NAME COUNT [-n --namespace NAMESPACE][--help | -h]'
+    scale_usg = 'chkit [--debug -d] scale KIND (NAME [NAME ...] | --selector -l SELECTOR) COUNT ' \
+                '[-n --namespace NAMESPACE][--workers -w WORKERS][--help | -h]'
     scale_description = "Change replicas count"
     parser_scale = subparsers.add_parser('scale', help=scale_usg, usage=scale_usg, description=scale_description,
                                          formatter_class=formatter_class)
     parser_scale._optionals.title = 'scale arguments'
     parser_scale.add_argument('kind', help='{deployment} object kind', choices=run_kinds, metavar="KIND")
-    parser_scale.add_argument('name', help='object name to get info', metavar="NAME", type=str)
-    parser_scale.add_argument('count', help='count of replicas', metavar="COUNT", type=int, choices=range(1, 10))
-    parser_scale.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False)
+    parser_scale.add_argument('name', help='deployment names', metavar="NAME", type=str, nargs='*').completer = ResourceCompleter('deployments')
+    parser_scale.add_argument('count', help='count of replicas: N, +N, -N, xN or N%%', metavar="COUNT")
+    parser_scale.add_argument('--selector', '-l', help='label selector: KEY=VALUE, KEY!=VALUE, "KEY in (A,B)", '
+                                                       '"KEY notin (A,B)", KEY, !KEY, comma separated', required=False)
+    parser_scale.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
+    parser_scale.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                              default=MAX_WORKERS, required=False)
+
+    logs_usg = 'chkit [--debug -d] logs (POD | --deploy -d DEPLOY) [--container -c CONTAINER][--follow -f]' \
+               '[--since SINCE][--tail TAIL][-n --namespace NAMESPACE][--help | -h]'
+    logs_description = "Show container logs of pod or of all pods of deploy"
+    parser_logs = subparsers.add_parser('logs', help=logs_usg, usage=logs_usg, description=logs_description,
+                                        formatter_class=formatter_class)
+    parser_logs._optionals.title = 'logs arguments'
+    parser_logs.add_argument('name', help='pod name', metavar="POD", nargs='?').completer = ResourceCompleter('pods')
+    parser_logs.add_argument('--deploy', '-d', help='show logs of all pods of deploy', required=False).completer = ResourceCompleter('deployments')
+    parser_logs.add_argument('--container', '-c', help='container name, default: first container', required=False)
+    parser_logs.add_argument('--follow', '-f', action='store_true', default=False, help='stream new log lines')
+    parser_logs.add_argument('--since', help='only lines newer than duration, for example 30s, 10m, 2h',
+                             required=False)
+    parser_logs.add_argument('--tail', help='number of last lines to show', type=int, required=False)
+    parser_logs.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
+    parser_logs.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                             default=MAX_WORKERS, required=False)
+
+    wait_usg = 'chkit [--debug -d] wait KIND/NAME [KIND/NAME ...] [--for CONDITION][--timeout TIMEOUT]' \
+               '[-n --namespace NAMESPACE][--workers -w WORKERS][--help | -h]'
+    wait_description = "Wait until objects match condition, exit code 0 - done, 1 - timeout, 2 - error"
+    parser_wait = subparsers.add_parser('wait', help=wait_usg, usage=wait_usg, description=wait_description,
+                                        formatter_class=formatter_class)
+    parser_wait._optionals.title = 'wait arguments'
+    parser_wait.add_argument('targets', help='objects to wait for, for example deploy/web po/web-1a2b3',
+                             metavar="KIND/NAME", nargs='+')
+    parser_wait.add_argument('--for', help='available (default), condition=TYPE, replicas=N or delete',
+                             default="available", metavar="CONDITION")
+    parser_wait.add_argument('--timeout', help='seconds to wait, default: {}'.format(DEFAULT_WAIT_TIMEOUT),
+                             type=float, default=DEFAULT_WAIT_TIMEOUT)
+    parser_wait.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
+    parser_wait.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                             default=MAX_WORKERS, required=False)
+
+    export_usg = 'chkit [--debug -d] export [NAMESPACE] --dir -d DIR [--workers -w WORKERS][--help | -h]'
+    export_description = "Write deployments, services and quota of namespace to DIR, one file per object"
+    parser_export = subparsers.add_parser('export', help=export_usg, usage=export_usg, description=export_description,
+                                          formatter_class=formatter_class)
+    parser_export._optionals.title = 'export arguments'
+    parser_export.add_argument('namespace', help='namespace, default: \"default\"', metavar="NAMESPACE",
+                               nargs='?').completer = ResourceCompleter('namespaces')
+    parser_export.add_argument('--dir', '-d', help='output directory', required=True)
+    parser_export.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                               default=MAX_WORKERS, required=False)
+
+    import_usg = 'chkit [--debug -d] import --dir -d DIR [-n --namespace NAMESPACE][--workers -w WORKERS][--help | -h]'
+    import_description = "Create objects exported to DIR, deployments first, then services"
+    parser_import = subparsers.add_parser('import', help=import_usg, usage=import_usg, description=import_description,
+                                          formatter_class=formatter_class)
+    parser_import._optionals.title = 'import arguments'
+    parser_import.add_argument('--dir', '-d', help='directory written by export', required=True)
+    parser_import.add_argument('--namespace', '-n', help='namespace, default: \"default\"', required=False).completer = ResourceCompleter('namespaces')
+    parser_import.add_argument('--workers', '-w', help='parallel requests, default: {}'.format(MAX_WORKERS), type=int,
+                               default=MAX_WORKERS, required=False)
 
     argcomplete.autocomplete(parser)
 
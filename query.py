@@ -0,0 +1,244 @@
+import operator
+import re
+
+PATH_ERROR = "field should look like .status.phase or .spec.containers[0].image: {}"
+UNKNOWN_FIELD_ERROR = "unknown field: {}, use .path.to.field, label:KEY or one of: {}"
+CONDITION_ERROR = "condition should look like FIELD==VALUE, FIELD!=VALUE, FIELD>N or FIELD=~REGEX: {}"
+NO_GROUP = "<none>"
+ORDERS = {"asc": False, "desc": True}
+
+
+def sum_restarts(item):
+    statuses = (item.get("status") or {}).get("containerStatuses")
+    if not statuses:
+        return None
+    return sum(s.get("restartCount") or 0 for s in statuses)
+
+
+def count_ready(item):
+    return sum(1 for s in (item.get("status") or {}).get("containerStatuses") or [] if s.get("ready"))
+
+
+ALIASES = {
+    "name": ".metadata.name",
+    "namespace": ".metadata.namespace",
+    "created": ".metadata.creationTimestamp",
+    "context": ".context",
+    "phase": ".status.phase",
+    "ip": ".status.podIP",
+    "node": ".spec.nodeName",
+    "restarts": sum_restarts,
+    "ready": count_ready,
+    "replicas": ".spec.replicas",
+    "available": ".status.availableReplicas",
+    "image": ".spec.template.spec.containers[0].image",
+    "type": ".spec.type",
+    "cluster-ip": ".spec.clusterIP",
+}
+
+# longer operators first, so != is not read as = with a value starting with !
+OPERATORS = (
+    ("==", operator.eq),
+    ("!=", operator.ne),
+    (">=", operator.ge),
+    ("<=", operator.le),
+    ("=~", None),
+    ("=", operator.eq),
+    (">", operator.gt),
+    ("<", operator.lt),
+)
+
+
+def compile_path(path):
+    """
+    Returns a function reading path from a decoded object, None when any step is missing
+    """
+    steps = []
+    position = 0
+    for match in re.finditer(r'\.([^.\[\]]+)|\[(-?\d+)\]', path):
+        if match.start() != position:
+            break
+        steps.append(int(match.group(2)) if match.group(2) is not None else match.group(1))
+        position = match.end()
+    if not steps or position != len(path):
+        raise ValueError(PATH_ERROR.format(path))
+    steps = tuple(steps)
+
+    def get(value):
+        for step in steps:
+            if isinstance(step, int):
+                if not isinstance(value, list) or not -len(value) <= step < len(value):
+                    return None
+                value = value[step]
+            elif isinstance(value, dict):
+                value = value.get(step)
+            else:
+                return None
+            if value is None:
+                return None
+        return value
+    return get
+
+
+def compile_field(field):
+    if field.startswith("label:"):
+        key = field[len("label:"):]
+        return lambda item: ((item.get("metadata") or {}).get("labels") or {}).get(key)
+    if field.startswith("."):
+        return compile_path(field)
+    alias = ALIASES.get(field)
+    if alias is None:
+        raise ValueError(UNKNOWN_FIELD_ERROR.format(field, ", ".join(sorted(ALIASES))))
+    return alias if callable(alias) else compile_path(alias)
+
+
+def to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_value(value):
+    if value is None:
+        return NO_GROUP
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def parse_condition(condition):
+    """
+    Returns (field, test) where test takes a field value
+    """
+    for symbol, op in OPERATORS:
+        field, found, expected = condition.partition(symbol)
+        if found:
+            break
+    else:
+        raise ValueError(CONDITION_ERROR.format(condition))
+    field, expected = field.strip(), expected.strip()
+    if not field:
+        raise ValueError(CONDITION_ERROR.format(condition))
+    compile_field(field)
+
+    if op is None:
+        try:
+            pattern = re.compile(expected)
+        except re.error:
+            raise ValueError(CONDITION_ERROR.format(condition))
+        return field, lambda value: value is not None and pattern.search(format_value(value)) is not None
+
+    number = to_number(expected)
+
+    def test(value):
+        if value is None:
+            return op is operator.ne
+        if number is not None:
+            value_number = to_number(value)
+            if value_number is not None:
+                return op(value_number, number)
+        return op(format_value(value), expected)
+    return field, test
+
+
+def parse_sort(sort_by):
+    """
+    Returns (field, descending) of FIELD, FIELD:asc, FIELD:desc or -FIELD
+    """
+    if not sort_by:
+        return sort_by, False
+    field, _, order = sort_by.rpartition(":")
+    if order in ORDERS and field and field != "label":
+        return field, ORDERS[order]
+    if sort_by.startswith("-"):
+        return sort_by[1:], True
+    return sort_by, False
+
+
+def sort_key(value):
+    number = to_number(value)
+    return (0, number, "") if number is not None else (1, 0, format_value(value))
+
+
+class Columns:
+    """
+    Columnar copy of the queried fields: one list of values per field, read from the items in one pass
+    """
+    def __init__(self, items, fields):
+        self.columns = {field: [] for field in fields}
+        readers = [(self.columns[field].append, compile_field(field)) for field in self.columns]
+        for item in items:
+            for append, get in readers:
+                append(get(item))
+        self.size = len(items)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+
+class Query:
+    """
+    --where, --sort-by and --group-by over the items of a decoded list. Fields are compiled
+    once, values are read into columns, then filtering and grouping take one pass over the rows
+    """
+    def __init__(self, where=None, sort_by=None, group_by=None, sums=None):
+        self.conditions = [parse_condition(c) for c in where or []]
+        self.sort_by, self.descending = parse_sort(sort_by)
+        self.group_by = group_by
+        self.sums = list(sums or [])
+        for field in self.fields():
+            compile_field(field)
+
+    def fields(self):
+        # groups can also be sorted by their count
+        sort_field = None if self.group_by and self.sort_by == "count" else self.sort_by
+        fields = [field for field, _ in self.conditions] + [sort_field, self.group_by] + self.sums
+        return list(dict.fromkeys(f for f in fields if f))
+
+    def rows(self, columns):
+        tests = [(columns[field], test) for field, test in self.conditions]
+        return [i for i in range(columns.size) if all(test(column[i]) for column, test in tests)]
+
+    def select(self, items):
+        """
+        Returns the items matching every condition, sorted by sort_by when given (missing values last)
+        """
+        columns = Columns(items, self.fields())
+        rows = self.rows(columns)
+        if self.sort_by:
+            column = columns[self.sort_by]
+            present = [i for i in rows if column[i] is not None]
+            present.sort(key=lambda i: sort_key(column[i]), reverse=self.descending)
+            rows = present + [i for i in rows if column[i] is None]
+        return [items[i] for i in rows]
+
+    def group(self, items):
+        """
+        Returns [(group value, count, [sum of every sums field])], sorted like sort_by
+        or by group value, non numeric values are not summed
+        """
+        columns = Columns(items, self.fields())
+        key_column = columns[self.group_by]
+        sum_columns = [columns[field] for field in self.sums]
+        groups = {}
+        for i in self.rows(columns):
+            group = groups.setdefault(format_value(key_column[i]), [0] + [0] * len(sum_columns))
+            group[0] += 1
+            for position, column in enumerate(sum_columns, 1):
+                number = to_number(column[i])
+                if number is not None:
+                    group[position] += number
+        result = [(key, values[0], values[1:]) for key, values in groups.items()]
+        if self.sort_by == "count":
+            result.sort(key=lambda g: g[1], reverse=self.descending)
+        elif self.sort_by in self.sums:
+            position = self.sums.index(self.sort_by)
+            result.sort(key=lambda g: g[2][position], reverse=self.descending)
+        else:
+            result.sort(key=lambda g: sort_key(g[0]), reverse=self.descending)
+        return result
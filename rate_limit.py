@@ -0,0 +1,135 @@
+import threading
+import time
+
+DEFAULT_RATE_LIMIT = {
+    "rate": 50,
+    "burst": 50,
+    "concurrency": 8,
+    "min_concurrency": 1,
+    "max_concurrency": 64,
+    "latency_factor": 3,
+}
+
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(server, api_handler_config):
+    """
+    One limiter per server shared by every ApiHandler of the process,
+    settings are RATE_LIMIT of api_handler config overridden by RATE_LIMIT_BY_SERVER[server]
+    """
+    with _limiters_lock:
+        if server not in _limiters:
+            settings = dict(DEFAULT_RATE_LIMIT)
+            settings.update(api_handler_config.get("RATE_LIMIT") or {})
+            settings.update((api_handler_config.get("RATE_LIMIT_BY_SERVER") or {}).get(server) or {})
+            _limiters[server] = Limiter(settings)
+        return _limiters[server]
+
+
+def get_limiters():
+    with _limiters_lock:
+        return dict(_limiters)
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average and bursts of up to burst requests
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available, returns seconds waited
+        """
+        if not self.rate:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class AdaptiveLimit:
+    """
+    AIMD limit of requests in flight: grows by one per limit successful requests,
+    halves on 429/5xx, timeouts or latency above latency_factor times the best seen
+    for the same endpoint, at most once per limit requests so one burst of failures
+    counts once. Endpoints are compared only with themselves, a large list is slow
+    by nature and says nothing about the server next to a get of one object
+    """
+    def __init__(self, initial, minimum, maximum, latency_factor):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_factor = latency_factor
+        self.best_latency = {}
+        self.in_flight = 0
+        self.since_decrease = 0
+        self.decreases = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, status_code, latency, endpoint=None):
+        with self.condition:
+            self.in_flight -= 1
+            self.since_decrease += 1
+            overloaded = status_code is None or status_code in OVERLOAD_STATUSES or status_code >= 500
+            if not overloaded and latency is not None:
+                best = self.best_latency.get(endpoint)
+                if best is None or latency < best:
+                    self.best_latency[endpoint] = best = latency
+                overloaded = latency > best * self.latency_factor and latency > 0.05
+            if overloaded:
+                if self.since_decrease >= self.limit:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.since_decrease = 0
+                    self.decreases += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class Limiter:
+    def __init__(self, settings):
+        self.bucket = TokenBucket(settings["rate"], settings["burst"])
+        self.concurrency = AdaptiveLimit(settings["concurrency"], settings["min_concurrency"],
+                                         settings["max_concurrency"], settings["latency_factor"])
+        self.requests = 0
+        self.waited = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        self.concurrency.acquire()
+        waited = self.bucket.acquire()
+        # fan_out workers acquire at the same time
+        with self.lock:
+            self.waited += waited
+            self.requests += 1
+        return time.monotonic()
+
+    def release(self, started, status_code, endpoint=None):
+        self.concurrency.release(status_code, time.monotonic() - started, endpoint)
+
+    def __str__(self):
+        return 'rate {:g}/s burst {:g}, concurrency {} (decreased {} times), {} requests, throttled {:.2f}s'.format(
+            self.bucket.rate, self.bucket.burst, int(self.concurrency.limit), self.concurrency.decreases,
+            self.requests, self.waited)
@@ -0,0 +1,146 @@
+import math
+import re
+import threading
+import time
+from bcolors import BColors
+from label_index import LabelIndex, from_match_labels
+from models import from_list
+
+WAVE_REGEX = re.compile(r"^(?P<value>\d+)(?P<percent>%?)$")
+
+WAVE_ERROR = "Wave must be positive integer or percent, for example 2 or 25%"
+RESTART_TIMEOUT_ERROR = "timeout waiting for pods to become ready"
+
+DEFAULT_WAVE = "25%"
+DEFAULT_TIMEOUT = 300
+DEFAULT_INTERVAL = 2
+
+
+def parse_wave(wave):
+    match = WAVE_REGEX.match(str(wave).strip())
+    if not match or int(match.group("value")) < 1:
+        raise ValueError(WAVE_ERROR)
+    return int(match.group("value")), bool(match.group("percent"))
+
+
+def wave_size(wave, replicas):
+    value, percent = parse_wave(wave)
+    if percent:
+        value = math.ceil(replicas * value / 100)
+    return max(1, value)
+
+
+class Budget:
+    """
+    Global limit of pods being restarted at the same time across deployments
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, count):
+        if not self.limit:
+            return count
+        count = min(count, self.limit)
+        with self.condition:
+            while self.used + count > self.limit:
+                self.condition.wait()
+            self.used += count
+        return count
+
+    def release(self, count):
+        if not self.limit:
+            return
+        with self.condition:
+            self.used -= count
+            self.condition.notify_all()
+
+
+class RollingRestart:
+    """
+    Deletes pods of a deployment in waves and waits until the replacement pods
+    are ready before starting the next wave
+    """
+    def __init__(self, execute, api_handler, namespace, wave=DEFAULT_WAVE, budget=None,
+                 timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL, debug=False):
+        self.execute = execute
+        self.api_handler = api_handler
+        self.namespace = namespace
+        self.wave = wave
+        self.budget = budget or Budget()
+        self.timeout = timeout
+        self.interval = interval
+        self.debug = debug
+
+    def restart(self, name):
+        """
+        Returns result dict in the same form as tcp results: {'error': ...} on failure
+        """
+        deployment = self.get_data(self.execute(self.api_handler.get, "deployments", name, self.namespace))
+        if "error" in deployment:
+            return deployment
+        replicas = deployment.get("spec").get("replicas") or 0
+        selector = deployment.get("spec").get("selector", {}).get("matchLabels") or \
+            deployment.get("metadata").get("labels") or {}
+
+        pods = self.list_pods(selector)
+        if isinstance(pods, dict):
+            return pods
+        pod_names = [p.name for p in pods]
+        size = wave_size(self.wave, replicas or len(pod_names))
+        waves = [pod_names[i:i + size] for i in range(0, len(pod_names), size)]
+
+        for number, wave in enumerate(waves, 1):
+            if self.debug:
+                print('{}restart {}: wave {}/{} {}{}'.format(
+                    BColors.OKBLUE,
+                    name,
+                    number,
+                    len(waves),
+                    ", ".join(wave),
+                    BColors.ENDC
+                ))
+            while wave:
+                acquired = self.budget.acquire(len(wave))
+                chunk, wave = wave[:acquired], wave[acquired:]
+                try:
+                    result = self.restart_pods(chunk, selector, replicas)
+                finally:
+                    self.budget.release(acquired)
+                if "error" in result:
+                    return result
+        return {"status": "Success"}
+
+    def restart_pods(self, pods, selector, replicas):
+        for pod in pods:
+            result = self.execute(self.api_handler.delete, "pods", pod, self.namespace, False)
+            if result.get("error"):
+                return result
+        return self.wait_ready(set(pods), selector, replicas)
+
+    def wait_ready(self, deleted, selector, replicas):
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            time.sleep(self.interval)
+            pods = self.list_pods(selector)
+            if isinstance(pods, dict):
+                return pods
+            alive = [p for p in pods if p.name not in deleted]
+            if len(alive) == len(pods) and sum(1 for p in alive if p.is_ready) >= replicas:
+                return {"status": "Success"}
+        return {"error": RESTART_TIMEOUT_ERROR}
+
+    def list_pods(self, selector):
+        data = self.get_data(self.execute(self.api_handler.get, "pods", None, self.namespace))
+        if "error" in data:
+            return data
+        items = data.get("items") or []
+        matched = LabelIndex.from_items(items).select(from_match_labels(selector))
+        return from_list(dict(data, items=[items[i] for i in sorted(matched)]))
+
+    @staticmethod
+    def get_data(tcp_result):
+        if not tcp_result or tcp_result.get("error"):
+            return {"error": (tcp_result or {}).get("error") or "TCP result is empty"}
+        return tcp_result.get("results")[0].get("data")
@@ -0,0 +1,200 @@
+"""
+Embeddable api of chkit: no argparse, no printing, no config read at import time.
+
+    from sdk import Containerum
+    with Containerum.from_config_file() as c:   # or from_config_file(config_dir="/srv/chkit")
+        c.run("web", "nginx", replicas=2)
+        c.wait(["deploy/web"])
+        print([p["metadata"]["name"] for p in c.get("pods")])
+
+Methods return decoded api objects and raise ChkitError subclasses on failure.
+One instance shares one tcp channel and is safe to use from many threads.
+"""
+import json
+import threading
+import uuid
+from api_handler import ApiHandler
+from bulk import fan_out, MAX_WORKERS
+from completion_index import KIND_ALIASES
+from config_json_handler import get_config_file, set_config_dir
+from manifests import build_deployment, build_expose, parse_service_port
+from tcp_handler import TcpHandler
+from wait import parse_target, parse_condition, wait_for, DEFAULT_TIMEOUT, EXIT_OK, EXIT_TIMEOUT
+
+
+class ChkitError(Exception):
+    pass
+
+
+class ApiError(ChkitError):
+    """
+    The api refused the request or the command failed, code is the status code when known
+    """
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class ChannelError(ChkitError):
+    pass
+
+
+class WaitTimeoutError(ChkitError):
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.errors = errors
+
+
+class Containerum:
+    def __init__(self, config, namespace=None, workers=MAX_WORKERS, config_dir=None):
+        """
+        config has the layout of CONFIG.json, namespace defaults to its default_namespace.
+        config_dir holds the dns, endpoint and list caches instead of ~/.containerum,
+        it is shared by the whole process
+        """
+        if config_dir:
+            set_config_dir(config_dir)
+        channel = str(uuid.uuid4())
+        self.namespace = namespace or config.get("default_namespace") or "default"
+        self.workers = workers
+        self.api_handler = ApiHandler(channel, config)
+        self.tcp_handler = TcpHandler(channel, False, config)
+        self.connected = False
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config_file(cls, file_name=None, config_dir=None, **kwargs):
+        """
+        Reads file_name, CONFIG.json of config_dir by default
+        """
+        if config_dir:
+            set_config_dir(config_dir)
+        with open(file_name or get_config_file(), 'r', encoding='utf-8') as f:
+            return cls(json.load(f), config_dir=config_dir, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.connected:
+                self.tcp_handler.close()
+            self.connected = False
+
+    def connect(self):
+        with self.lock:
+            if self.connected:
+                return
+            try:
+                result = self.tcp_handler.connect()
+            except (RuntimeError, OSError) as e:
+                raise ChannelError(str(e))
+            if not result.get("ok", True) or result.get("error"):
+                raise ChannelError(result.get("error") or "tcp authorization failed")
+            self.connected = True
+
+    def execute(self, api_call, *args):
+        """
+        Sends one request and returns data of every result of the command
+        """
+        self.connect()
+        api_result = api_call(*args)
+        if 'error' in api_result or not api_result.get('id'):
+            raise ApiError(api_result.get('error') or 'empty command id')
+        try:
+            tcp_result = self.tcp_handler.receive(api_result.get('id'))
+        except RuntimeError as e:
+            raise ChannelError(str(e))
+        if not tcp_result:
+            raise ChannelError("TCP result is empty")
+        if tcp_result.get("error") or tcp_result.get("status") == "Failure":
+            raise ApiError(tcp_result.get("error") or "command failed", tcp_result.get("code"))
+        return [r.get("data") for r in tcp_result.get("results") or []]
+
+    def get(self, kind, name=None, namespace=None):
+        """
+        Returns the object, or the list of items when name is not given
+        """
+        kind = get_kind(kind)
+        if kind == "namespaces":
+            return self.execute(self.api_handler.get_namespaces, name)
+        data = self.execute(self.api_handler.get, kind, name, namespace or self.namespace)[0]
+        if name:
+            return data
+        return data.get("items") or []
+
+    def run(self, name, image, replicas=1, ports=None, labels=None, env=None, cpu="100m", memory="128Mi",
+            commands=None, namespace=None):
+        """
+        labels and env are KEY=VALUE strings or dicts
+        """
+        manifest = build_deployment(name, image, ports=ports, labels=labels, env=env, cpu=cpu, memory=memory,
+                                    replicas=replicas, commands=commands)
+        return self.execute(self.api_handler.run, manifest, namespace or self.namespace)[0]
+
+    def create(self, manifest, namespace=None):
+        return self.execute(self.api_handler.create, manifest, namespace or self.namespace)[0]
+
+    def scale(self, name, replicas, namespace=None):
+        return self.execute(self.api_handler.scale, {"replicas": int(replicas)}, name, namespace or self.namespace)[0]
+
+    def set_image(self, name, image, container=None, namespace=None):
+        """
+        Container defaults to the one named after the deployment, as chkit run creates it
+        """
+        return self.execute(self.api_handler.set, {"name": name, "image": image}, container or name,
+                            namespace or self.namespace)[0]
+
+    def delete(self, kind, name, namespace=None, all_pods=False):
+        kind = get_kind(kind)
+        if kind == "namespaces":
+            return self.execute(self.api_handler.delete_namespaces, name)[0]
+        return self.execute(self.api_handler.delete, kind, name, namespace or self.namespace, all_pods)[0]
+
+    def expose(self, name, ports, namespace=None):
+        """
+        ports are expose PORTS strings: PORTNAME:TARGETPORT[:PROTOCOL] or PORTNAME:TARGETPORT:PORT[:PROTOCOL]
+        """
+        namespace = namespace or self.namespace
+        try:
+            for port in ports:
+                parse_service_port(port)
+        except ValueError as e:
+            raise ChkitError(str(e))
+        self.get("deployments", name, namespace)
+        return self.execute(self.api_handler.expose, build_expose(name, namespace, ports), namespace)[0]
+
+    def wait(self, targets, condition="available", timeout=DEFAULT_TIMEOUT, namespace=None):
+        """
+        Blocks until every KIND/NAME target matches condition, raises WaitTimeoutError
+        """
+        try:
+            targets = [parse_target(t) for t in targets]
+            check = parse_condition(condition)
+        except ValueError as e:
+            raise ChkitError(str(e))
+        namespace = namespace or self.namespace
+
+        def list_kind(kind):
+            try:
+                return self.get(kind, namespace=namespace)
+            except ChkitError as e:
+                return {'error': str(e)}
+
+        code, errors = wait_for(list_kind, targets, check, timeout,
+                                lambda func, jobs: fan_out(func, jobs, self.workers))
+        if code == EXIT_OK:
+            return
+        messages = {'{}/{}'.format(*target): error for target, error in errors.items()}
+        if code == EXIT_TIMEOUT:
+            raise WaitTimeoutError("; ".join(messages.values()), messages)
+        raise ApiError("; ".join(messages.values()))
+
+
+def get_kind(kind):
+    if kind not in KIND_ALIASES:
+        raise ChkitError("unknown kind: {}".format(kind))
+    return KIND_ALIASES[kind]
@@ -0,0 +1,184 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+import requests
+import dialer
+
+REPLAY_EXHAUSTED_ERROR = "replay session has no recorded response for {} {}"
+
+_session = None
+
+
+def get_session():
+    return _session
+
+
+def start_recording(file_name):
+    global _session
+    _session = SessionRecorder(file_name)
+    return _session
+
+
+def start_replay(file_name, speed=0):
+    global _session
+    _session = SessionReplayer(file_name, speed)
+    return _session
+
+
+def stop():
+    global _session
+    if _session:
+        _session.close()
+    _session = None
+
+
+def connect_socket(address, timeout=dialer.CONNECT_TIMEOUT, dns_ttl=dialer.DNS_TTL):
+    if _session:
+        return _session.connect_socket(address, timeout, dns_ttl)
+    return dialer.connect(address, timeout, dns_ttl)
+
+
+class SessionRecorder:
+    """
+    Writes every http response and received tcp frame with its time offset to a gzipped json lines
+    file. What chkit sends is left out, the auth form carries the token and replay never reads it
+    """
+    def __init__(self, file_name):
+        # sessions are shared for repro, still only the owner may read them
+        self.raw_file = open(os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb')
+        os.chmod(file_name, 0o600)
+        self.file = gzip.open(self.raw_file, 'wt', encoding='utf-8')
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def write(self, event):
+        event["t"] = round(time.time() - self.start, 4)
+        with self.lock:
+            self.file.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+    def send_request(self, send, url, headers, timeout, method, json_to_send=None, compress=False):
+        try:
+            status_code, content = send(url, headers, timeout, method, json_to_send, compress)
+        except requests.exceptions.Timeout:
+            self.write({"type": "http", "method": method, "url": url, "exception": "timeout"})
+            raise
+        except requests.exceptions.RequestException:
+            self.write({"type": "http", "method": method, "url": url, "exception": "connection"})
+            raise
+        self.write({"type": "http", "method": method, "url": url, "status": status_code,
+                    "body": content.decode('utf-8', 'replace')})
+        return status_code, content
+
+    def connect_socket(self, address, timeout, dns_ttl):
+        s = dialer.connect(address, timeout, dns_ttl)
+        with self.lock:
+            self.connections += 1
+            connection = self.connections
+        self.write({"type": "tcp_connect", "conn": connection})
+        return RecordingSocket(s, self, connection)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            self.raw_file.close()
+
+
+class RecordingSocket:
+    def __init__(self, s, recorder, connection):
+        self.s = s
+        self.recorder = recorder
+        self.connection = connection
+
+    def recv(self, buffer_size):
+        data = self.s.recv(buffer_size)
+        self.recorder.write({"type": "tcp_recv", "conn": self.connection,
+                             "data": base64.b64encode(data).decode('ascii')})
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.s, name)
+
+
+class SessionReplayer:
+    """
+    Serves responses from a recorded session without network, speed 0 replays as fast as possible,
+    1 keeps original timing, 2 is twice as fast
+    """
+    def __init__(self, file_name, speed=0):
+        self.speed = speed
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.http = defaultdict(deque)
+        self.tcp = defaultdict(deque)
+        self.connections = 0
+        with gzip.open(file_name, 'rt', encoding='utf-8') as f:
+            for line in f:
+                event = json.loads(line)
+                if event["type"] == "http":
+                    self.http[(event["method"], event["url"])].append(event)
+                elif event["type"] == "tcp_recv":
+                    self.tcp[event["conn"]].append(event)
+
+    def wait(self, event):
+        if self.speed:
+            delay = self.start + event["t"] / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def send_request(self, send, url, headers, timeout, method, json_to_send=None, compress=False):
+        with self.lock:
+            events = self.http.get((method, url))
+            if not events:
+                raise requests.exceptions.ConnectionError(REPLAY_EXHAUSTED_ERROR.format(method, url))
+            event = events.popleft()
+        self.wait(event)
+        if event.get("exception") == "timeout":
+            raise requests.exceptions.Timeout()
+        if event.get("exception"):
+            raise requests.exceptions.ConnectionError()
+        return event["status"], event["body"].encode('utf-8')
+
+    def connect_socket(self, address, timeout, dns_ttl):
+        with self.lock:
+            self.connections += 1
+            return ReplaySocket(self, self.tcp[self.connections])
+
+    def close(self):
+        pass
+
+
+class ReplaySocket:
+    def __init__(self, replayer, events):
+        self.replayer = replayer
+        self.events = events
+        self.pending = b''
+
+    def recv(self, buffer_size):
+        if not self.pending:
+            if not self.events:
+                return b''
+            event = self.events.popleft()
+            self.replayer.wait(event)
+            self.pending = base64.b64decode(event["data"])
+        data, self.pending = self.pending[:buffer_size], self.pending[buffer_size:]
+        return data
+
+    def send(self, data):
+        return len(data)
+
+    def sendall(self, data):
+        return None
+
+    def setsockopt(self, *args):
+        pass
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
@@ -1,39 +1,151 @@
-import socket
 import json
+import threading
+import time
 from bcolors import BColors
 from config_json_handler import get_json_from_config
 from keywords import *
+from session_transport import connect_socket
+from compression import get_stream_encodings, get_stream_decompressor
+from framing import JsonLineFramer, get_framer, get_framings
+from endpoints import rank, mark_failed, get_address
+from dialer import CONNECT_TIMEOUT, DNS_TTL
+from memstats import phase
 
-config_json_data = get_json_from_config()
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BACKOFF = 0.5
+RECONNECT_BACKOFF_MAX = 8
 
 
 class TcpHandler:
-    def __init__(self, uuid_v4, debug):
+    def __init__(self, uuid_v4, debug, config=None):
+        config = (config or get_json_from_config()).get("tcp_handler")
         self.debug = debug
-        self.TCP_IP = config_json_data.get("tcp_handler").get("TCP_IP")
-        self.TCP_PORT = config_json_data.get("tcp_handler").get("TCP_PORT")
-        self.BUFFER_SIZE = config_json_data.get("tcp_handler").get("BUFFER_SIZE")
+        self.TCP_IP = config.get("TCP_IP")
+        self.TCP_PORT = config.get("TCP_PORT")
+        self.endpoints = rank(['{}:{}'.format(self.TCP_IP, self.TCP_PORT)] + list(config.get("ENDPOINTS") or []))
+        self.BUFFER_SIZE = config.get("BUFFER_SIZE")
+        self.CONNECT_TIMEOUT = config.get("CONNECT_TIMEOUT", CONNECT_TIMEOUT)
+        self.DNS_TTL = config.get("DNS_TTL", DNS_TTL)
+        self.RECONNECT_ATTEMPTS = config.get("RECONNECT_ATTEMPTS", RECONNECT_ATTEMPTS)
+        self.RECONNECT_BACKOFF = config.get("RECONNECT_BACKOFF", RECONNECT_BACKOFF)
         self.AUTH_FORM = {
             "channel": uuid_v4,
-            "token": config_json_data.get("tcp_handler").get("AUTH_FORM").get("token"),
+            "token": config.get("AUTH_FORM").get("token"),
         }
+        if config.get("COMPRESSION", True):
+            self.AUTH_FORM["compression"] = get_stream_encodings()
+        if config.get("BINARY_FRAMING", True):
+            self.AUTH_FORM["framing"] = get_framings()
+        self.decompressor = None
+        self.framer = JsonLineFramer()
+        self.s = None
+        self.pending_connect = None
+        self.pending_result = None
+        self.results = {}
+        self.acknowledged = set()
+        self.last_id = None
+        self.lock = threading.Lock()
+
+    def start_connect(self):
+        """
+        Connects and authorizes in a background thread, the next connect() waits for it
+        instead of opening another socket
+        """
+        def run():
+            try:
+                self.pending_result = self.open()
+            except Exception as e:
+                self.pending_result = e
+        self.pending_connect = threading.Thread(target=run, daemon=True)
+        self.pending_connect.start()
 
     def connect(self):
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.s.connect((self.TCP_IP, self.TCP_PORT))
-        self.s.send((json.dumps(self.AUTH_FORM) + '\n').encode('utf-8'))
-        data = self.s.recv(self.BUFFER_SIZE)
-        if not data:
+        pending, self.pending_connect = self.pending_connect, None
+        if not pending:
+            return self.open()
+        pending.join()
+        result, self.pending_result = self.pending_result, None
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def open(self):
+        self.s = self.connect_endpoint()
+        auth_form = dict(self.AUTH_FORM)
+        if self.last_id:
+            auth_form["resume_from"] = self.last_id
+        self.s.send((json.dumps(auth_form) + '\n').encode('utf-8'))
+        self.decompressor = None
+        self.framer = JsonLineFramer()
+        received = self.s.recv(self.BUFFER_SIZE)
+        if not received:
             raise RuntimeError(TCP_RUNTIME_ERROR)
-        else:
-            result = json.loads(data.decode('utf-8'))
+        self.framer.feed(received)
+        data = self.framer.next_frame()
+        if data is None:
+            data, self.framer.buffer = bytes(self.framer.buffer), bytearray()
+        result = json.loads(data.decode('utf-8'))
+
+        # the auth answer is always a json line, everything after it uses the negotiated
+        # compression and framing
+        rest = bytes(self.framer.buffer)
+        self.decompressor = get_stream_decompressor(result.get("compression"))
+        self.framer = get_framer(result.get("framing"))
+        if self.decompressor and rest:
+            rest = self.decompressor.decompress(rest)
+        self.framer.feed(rest)
 
         return result
 
-    def receive(self):
-        data = ''
-        while data[-1::] != '\n':
-            received = self.s.recv(self.BUFFER_SIZE).decode('utf-8')
+    def connect_endpoint(self):
+        """
+        Connects to the fastest reachable endpoint, a failed one is moved to the end
+        so reconnects and later runs go elsewhere
+        """
+        error = None
+        for endpoint in list(self.endpoints):
+            try:
+                s = connect_socket(get_address(endpoint), self.CONNECT_TIMEOUT, self.DNS_TTL)
+                if endpoint != self.endpoints[0]:
+                    self.endpoints.remove(endpoint)
+                    self.endpoints.insert(0, endpoint)
+                self.TCP_IP, self.TCP_PORT = get_address(endpoint)
+                return s
+            except OSError as e:
+                error = e
+                mark_failed(endpoint)
+                if self.debug:
+                    print('{}tcp endpoint {} failed: {}{}'.format(BColors.WARNING, endpoint, e, BColors.ENDC))
+        raise error
+
+    def reconnect(self):
+        """
+        Reopens the channel with the same uuid and asks the server to replay
+        results after the last acknowledged command id
+        """
+        self.close()
+        delay = self.RECONNECT_BACKOFF
+        for attempt in range(1, self.RECONNECT_ATTEMPTS + 1):
+            if self.debug:
+                print('{}tcp reconnect attempt {}...{}'.format(
+                    BColors.WARNING,
+                    attempt,
+                    BColors.ENDC
+                ))
+            try:
+                result = self.open()
+                if result.get("ok") or not result.get("error"):
+                    return result
+            except (OSError, RuntimeError, ValueError):
+                self.close()
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+        raise RuntimeError(TCP_RUNTIME_ERROR)
+
+    def read_frame(self):
+        frame = self.framer.next_frame()
+        while frame is None:
+            received = self.s.recv(max(self.BUFFER_SIZE, self.framer.missing()))
             if not received:
                 raise RuntimeError(TCP_RUNTIME_ERROR)
             if self.debug:
@@ -42,32 +154,64 @@ class TcpHandler:
                     len(received),
                     BColors.ENDC
                 ))
-            data += received
-            # print(len(data))
-            # print(data[-1::] == '\n')
-        # data = self.s.recv(self.BUFFER_SIZE)
+            if self.decompressor:
+                received = self.decompressor.decompress(received)
+            self.framer.feed(received)
+            frame = self.framer.next_frame()
+        return frame
 
-        try:
-            result = json.loads(data)
-            if self.debug:
-                print('{}{}...{} {}OK{}'.format(
-                    BColors.OKBLUE,
-                    TCP_COMPLETE,
-                    BColors.ENDC,
-                    BColors.BOLD,
-                    BColors.ENDC
-                ))
-        except Exception:
-            with open('received_str', 'w', encoding='utf-8') as w:
-                w.write(data.decode('utf-8'))
-            result = {}
-        # print(json.dumps(result, indent=4))
-        # pretty_json = json.dumps(result, indent=4)
+    def receive(self, command_id=None):
+        """
+        Returns the result for command_id (or the next result if it is None),
+        reconnecting on a dropped socket and skipping replayed duplicates
+        """
+        with self.lock:
+            while True:
+                if command_id in self.results:
+                    return self.results.pop(command_id)
+                if command_id is None and self.results:
+                    return self.results.pop(next(iter(self.results)))
 
-        return result
+                try:
+                    with phase("receive"):
+                        data = self.read_frame()
+                except (OSError, RuntimeError):
+                    self.reconnect()
+                    continue
+
+                try:
+                    with phase("decode"):
+                        result = self.framer.decode(data)
+                    if self.debug:
+                        print('{}{}...{} {}OK{}'.format(
+                            BColors.OKBLUE,
+                            TCP_COMPLETE,
+                            BColors.ENDC,
+                            BColors.BOLD,
+                            BColors.ENDC
+                        ))
+                except Exception:
+                    with open('received_str', 'w', encoding='utf-8') as w:
+                        w.write(data.decode('utf-8', 'replace'))
+                    return {}
+
+                result_id = result.get("id") if isinstance(result, dict) else None
+                if result_id is None:
+                    return result
+                if result_id in self.acknowledged:
+                    continue
+                self.acknowledged.add(result_id)
+                self.last_id = result_id
+                if command_id is None or result_id == command_id:
+                    return result
+                self.results[result_id] = result
 
     def close(self):
-        self.s.close()
+        if self.pending_connect:
+            self.pending_connect.join()
+            self.pending_connect = None
+        if self.s:
+            self.s.close()
 
 
 def check_http_status(result, command):
@@ -99,4 +243,4 @@ def check_http_status(result, command):
             "TCP result is empty",
             BColors.ENDC,
         ))
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,38 @@
+import unittest
+
+from manifest_diff import merge_patch, apply_merge_patch, format_changes
+
+
+def deployment(containers, replicas=1):
+    return {"kind": "Deployment", "metadata": {"name": "web"},
+            "spec": {"replicas": replicas, "template": {"spec": {"containers": containers}}}}
+
+
+LIVE = deployment([{"name": "web", "image": "nginx", "imagePullPolicy": "Always",
+                    "resources": {"limits": {"cpu": "100m", "memory": "128Mi"}},
+                    "env": [{"name": "A", "value": "1"}]}])
+
+
+class MergePatchTest(unittest.TestCase):
+    def test_server_filled_fields_are_no_change(self):
+        local = deployment([{"name": "web", "image": "nginx", "env": [{"name": "A", "value": "1"}]}])
+        self.assertEqual(merge_patch(LIVE, local), {})
+
+    def test_changed_container_keeps_server_filled_fields(self):
+        local = deployment([{"name": "web", "image": "nginx:2", "env": [{"name": "A", "value": "1"}]}])
+        patch = merge_patch(LIVE, local)
+        container = apply_merge_patch(LIVE, patch)["spec"]["template"]["spec"]["containers"][0]
+        self.assertEqual(container["image"], "nginx:2")
+        self.assertEqual(container["resources"], {"limits": {"cpu": "100m", "memory": "128Mi"}})
+        self.assertEqual(format_changes(LIVE, patch),
+                         ['~ spec.template.spec.containers[web].image: "nginx" -> "nginx:2"'])
+
+    def test_removed_item_is_a_change(self):
+        local = deployment([{"name": "web", "image": "nginx", "env": []}])
+        patch = merge_patch(LIVE, local)
+        self.assertEqual(format_changes(LIVE, patch),
+                         ['- spec.template.spec.containers[web].env[A]: {"name":"A","value":"1"}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
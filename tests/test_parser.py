@@ -0,0 +1,38 @@
+import unittest
+
+from parser import create_parser
+from query import Query
+
+
+class SortByTest(unittest.TestCase):
+    def get_query(self, *args):
+        args = vars(create_parser("test").parse_args(["get", "pods"] + list(args)))
+        return Query(sort_by=args["sort_by"], group_by=args["group_by"])
+
+    def test_descending_as_a_separate_argument(self):
+        query = self.get_query("--sort-by", "name:desc")
+        self.assertEqual((query.sort_by, query.descending), ("name", True))
+
+    def test_ascending(self):
+        for value in ("name", "name:asc"):
+            query = self.get_query("--sort-by", value)
+            self.assertEqual((query.sort_by, query.descending), ("name", False))
+
+    def test_label_field(self):
+        query = self.get_query("--sort-by", "label:app:desc")
+        self.assertEqual((query.sort_by, query.descending), ("label:app", True))
+        query = self.get_query("--sort-by", "label:desc")
+        self.assertEqual((query.sort_by, query.descending), ("label:desc", False))
+
+    def test_dash_prefix_with_equals(self):
+        query = self.get_query("--sort-by=-restarts")
+        self.assertEqual((query.sort_by, query.descending), ("restarts", True))
+
+    def test_descending_order(self):
+        items = [{"metadata": {"name": name}} for name in ("b", "c", "a")]
+        names = [i["metadata"]["name"] for i in self.get_query("--sort-by", "name:desc").select(items)]
+        self.assertEqual(names, ["c", "b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
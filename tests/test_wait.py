@@ -0,0 +1,36 @@
+import time
+import unittest
+
+from wait import wait_for, parse_condition, EXIT_OK, EXIT_TIMEOUT, WAIT_TIMEOUT_ERROR
+
+
+def deployment(name, available):
+    return {"metadata": {"name": name}, "spec": {"replicas": 1, "template": {}},
+            "status": {"updatedReplicas": 1, "availableReplicas": available}}
+
+
+class WaitForTest(unittest.TestCase):
+    def test_waits_the_whole_timeout(self):
+        for timeout in (0.5, 1.3):
+            started = time.monotonic()
+            code, errors = wait_for(lambda kind: [deployment("web", 0)], [("deployments", "web")],
+                                    parse_condition("available"), timeout=timeout)
+            elapsed = time.monotonic() - started
+            self.assertEqual(code, EXIT_TIMEOUT)
+            self.assertEqual(errors, {("deployments", "web"): WAIT_TIMEOUT_ERROR.format("deployments/web")})
+            self.assertGreaterEqual(elapsed, timeout)
+            self.assertLess(elapsed, timeout + 0.5)
+
+    def test_checks_again_at_the_deadline(self):
+        timeout = 0.5
+        started = time.monotonic()
+
+        def list_kind(kind):
+            # available only once the deadline is reached
+            return [deployment("web", 1 if time.monotonic() - started >= timeout else 0)]
+        code, errors = wait_for(list_kind, [("deployments", "web")], parse_condition("available"), timeout=timeout)
+        self.assertEqual((code, errors), (EXIT_OK, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,422 @@
+#!/usr/bin/python3
+"""
+Local stand-in for the Containerum api and tcp event channel, for testing chkit offline.
+
+    python3 utils/stub_server.py --api-port 3333 --tcp-port 3000
+
+and point "server" and "TCP_IP"/"TCP_PORT" of ~/.containerum/CONFIG.json to it.
+Objects are kept in memory, every api request answers {"id": COMMAND_ID} and pushes
+the result to the channel from the «Channel» header. The channel supports json lines,
+length prefixed msgpack/cbor framing and deflate compression, negotiated in AUTH_FORM.
+Lists asked with ?resourceVersion= answer only the changes since it, or 410 when they are gone.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framing import get_framer, get_framings
+from manifest_diff import apply_merge_patch
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+RESULT_DELAY = 0.01
+HISTORY_SIZE = 1000
+LIST_KINDS = ("deployments", "services", "pods")
+
+
+class Expired(Exception):
+    pass
+
+
+def now():
+    return datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+
+
+class Channel:
+    """
+    One authorized tcp connection with its negotiated framing and compression
+    """
+    def __init__(self, connection, framing, compression):
+        self.connection = connection
+        self.framer = get_framer(framing)
+        self.compressor = zlib.compressobj() if compression == "deflate" else None
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        data = self.framer.encode(message)
+        with self.lock:
+            if self.compressor:
+                data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.connection.sendall(data)
+
+
+class Store:
+    """
+    Objects by namespace and kind; every change bumps the resourceVersion and is kept
+    in a bounded history, lists asked with an older resourceVersion get only the changes
+    """
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.namespaces = {}
+        self.lock = threading.RLock()
+        self.version = 0
+        self.compacted = 0
+        self.history = deque(maxlen=history_size)
+        self.seen = {}
+
+    def record_changes(self):
+        with self.lock:
+            current = {}
+            for namespace, objects in self.namespaces.items():
+                for kind in LIST_KINDS:
+                    for name, obj in objects[kind].items():
+                        current[(namespace, kind, name)] = (json.dumps(obj, sort_keys=True), obj)
+            for key, (dump, obj) in current.items():
+                previous = self.seen.get(key)
+                if previous is None or previous[0] != dump:
+                    self.add_event(key, "ADDED" if previous is None else "MODIFIED", json.loads(dump))
+            for key, (dump, obj) in self.seen.items():
+                if key not in current:
+                    self.add_event(key, "DELETED", json.loads(dump))
+            self.seen = current
+
+    def add_event(self, key, event_type, obj):
+        self.version += 1
+        if len(self.history) == self.history.maxlen:
+            self.compacted = self.history[0][0]
+        self.history.append((self.version, key[0], key[1], {"type": event_type, "object": obj}))
+
+    def list(self, namespace, kind, resource_version=None):
+        with self.lock:
+            data = {"kind": kind[:-1].capitalize() + "List", "metadata": {"resourceVersion": str(self.version)}}
+            if not resource_version:
+                data["items"] = list(self.namespace(namespace)[kind].values())
+                return data
+            resource_version = int(resource_version)
+            if resource_version < self.compacted or resource_version > self.version:
+                raise Expired("resourceVersion {} expired".format(resource_version))
+            data["events"] = [event for version, ns, k, event in self.history
+                              if version > resource_version and ns == namespace and k == kind]
+            return data
+
+    def namespace(self, name):
+        with self.lock:
+            return self.namespaces.setdefault(name, {
+                "deployments": {},
+                "services": {},
+                "pods": {},
+                "created": now(),
+            })
+
+    def create(self, namespace, kind, body):
+        with self.lock:
+            objects = self.namespace(namespace)[kind]
+            name = body["metadata"]["name"]
+            if name in objects:
+                raise ValueError("{} {} already exists".format(kind, name))
+            body["metadata"]["namespace"] = namespace
+            body["metadata"]["creationTimestamp"] = now()
+            if kind == "deployments":
+                self.init_deployment(body)
+            if kind == "services":
+                body["spec"]["clusterIP"] = "10.0.0.{}".format(len(objects) + 1)
+            objects[name] = body
+            if kind == "deployments":
+                self.sync_pods(namespace, body)
+            return body
+
+    @staticmethod
+    def init_deployment(body):
+        labels = body["metadata"].setdefault("labels", {})
+        labels.setdefault("app", body["metadata"]["name"])
+        body["spec"].setdefault("selector", {"matchLabels": dict(labels)})
+        body["spec"]["template"].setdefault("metadata", {}).setdefault("labels", {}).update(labels)
+        body["spec"].setdefault("strategy", {"type": "RollingUpdate",
+                                             "rollingUpdate": {"maxUnavailable": 1, "maxSurge": 1}})
+        for c in body["spec"]["template"]["spec"]["containers"]:
+            resources = c.setdefault("resources", {})
+            resources.setdefault("limits", dict(resources.get("requests") or {"cpu": "100m", "memory": "128Mi"}))
+
+    def sync_pods(self, namespace, deployment):
+        pods = self.namespace(namespace)["pods"]
+        selector = deployment["spec"]["selector"]["matchLabels"]
+        owned = [p for p in pods.values() if all(p["metadata"]["labels"].get(k) == v for k, v in selector.items())]
+        replicas = deployment["spec"]["replicas"]
+        for pod in owned[replicas:]:
+            pods.pop(pod["metadata"]["name"])
+        for _ in range(replicas - len(owned)):
+            self.add_pod(namespace, deployment)
+        deployment["status"] = {
+            "replicas": replicas,
+            "updatedReplicas": replicas,
+            "availableReplicas": replicas,
+            "conditions": [{"type": "Available", "status": "True", "reason": "MinimumReplicasAvailable"}],
+        }
+
+    def add_pod(self, namespace, deployment):
+        name = "{}-{}".format(deployment["metadata"]["name"], uuid.uuid4().hex[:5])
+        containers = deployment["spec"]["template"]["spec"]["containers"]
+        self.namespace(namespace)["pods"][name] = {
+            "kind": "Pod",
+            "metadata": {
+                "name": name,
+                "namespace": namespace,
+                "labels": dict(deployment["spec"]["template"]["metadata"]["labels"]),
+                "creationTimestamp": now(),
+            },
+            "spec": {"containers": containers, "restartPolicy": "Always", "terminationGracePeriodSeconds": 30},
+            "status": {
+                "phase": "Running",
+                "podIP": "10.1.0.{}".format(len(self.namespace(namespace)["pods"]) + 1),
+                "startTime": now(),
+                "containerStatuses": [{"name": c["name"], "ready": True, "restartCount": 0} for c in containers],
+                "conditions": [{"type": "Ready", "status": "True", "lastTransitionTime": now()}],
+            },
+        }
+
+    def owner(self, namespace, pod):
+        for deployment in self.namespace(namespace)["deployments"].values():
+            selector = deployment["spec"]["selector"]["matchLabels"]
+            if all(pod["metadata"]["labels"].get(k) == v for k, v in selector.items()):
+                return deployment
+
+    def quota(self, namespace):
+        return {
+            "kind": "ResourceQuota",
+            "metadata": {"name": "quota", "namespace": namespace,
+                         "creationTimestamp": self.namespace(namespace)["created"]},
+            "status": {
+                "hard": {"limits.cpu": "4", "limits.memory": "8Gi", "requests.cpu": "4", "requests.memory": "8Gi"},
+                "used": {"limits.cpu": "0", "limits.memory": "0", "requests.cpu": "0", "requests.memory": "0"},
+            },
+        }
+
+
+class StubServer:
+    def __init__(self, framings, compression, history_size=HISTORY_SIZE):
+        self.framings = framings
+        self.compression = compression
+        self.store = Store(history_size)
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def push(self, channel_id, message):
+        time.sleep(RESULT_DELAY)
+        with self.lock:
+            channel = self.channels.get(channel_id)
+        if channel:
+            try:
+                channel.send(message)
+            except OSError:
+                pass
+
+    def serve_tcp(self, host, port):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(64)
+        while True:
+            connection, _ = server.accept()
+            threading.Thread(target=self.authorize, args=(connection,), daemon=True).start()
+
+    def authorize(self, connection):
+        data = b''
+        while b'\n' not in data:
+            received = connection.recv(1024)
+            if not received:
+                connection.close()
+                return
+            data += received
+        auth = json.loads(data.split(b'\n', 1)[0].decode('utf-8'))
+        framing = next((f for f in auth.get("framing") or [] if f in self.framings), "json")
+        compression = "deflate" if self.compression and "deflate" in (auth.get("compression") or []) else None
+        answer = {"ok": True, "framing": framing, "compression": compression}
+        connection.sendall((json.dumps(answer) + '\n').encode('utf-8'))
+        with self.lock:
+            self.channels[auth.get("channel")] = Channel(connection, framing, compression)
+
+    def handle(self, method, path, query, body):
+        """
+        Returns result data for the tcp channel
+        """
+        parts = path.strip("/").split("/")
+        store = self.store
+        if parts[0] != "namespaces":
+            return {"status": "Success"}
+        if len(parts) == 1:
+            return [store.quota(ns) for ns in sorted(store.namespaces)]
+        namespace = parts[1]
+        if len(parts) == 2:
+            if method == "DELETE":
+                store.namespaces.pop(namespace, None)
+                return {"status": "Success"}
+            data = {"kind": "Namespace", "metadata": {"name": namespace,
+                                                       "creationTimestamp": store.namespace(namespace)["created"]},
+                    "status": {"phase": "Active"}}
+            return [data, store.quota(namespace)]
+
+        kind = parts[2]
+        with store.lock:
+            if kind == "container":
+                deployment = store.namespace(namespace)["deployments"][body["name"]]
+                for c in deployment["spec"]["template"]["spec"]["containers"]:
+                    if c["name"] == parts[3]:
+                        c["image"] = body["image"]
+                return deployment
+            objects = store.namespace(namespace)[kind]
+            if method == "POST":
+                return store.create(namespace, kind, body)
+            if len(parts) == 3:
+                return store.list(namespace, kind, parse_qs(query).get("resourceVersion", [None])[0])
+            name = parts[3]
+            if method == "GET":
+                return objects[name]
+            if method == "DELETE":
+                if kind == "deployments" and len(parts) == 5:
+                    for pod in [p for p in store.namespace(namespace)["pods"].values()
+                                if store.owner(namespace, p) is objects[name]]:
+                        store.namespace(namespace)["pods"].pop(pod["metadata"]["name"])
+                    store.sync_pods(namespace, objects[name])
+                    return {"status": "Success"}
+                deleted = objects.pop(name)
+                if kind == "pods":
+                    deployment = store.owner(namespace, deleted)
+                    if deployment:
+                        store.sync_pods(namespace, deployment)
+                return {"status": "Success"}
+            if method == "PATCH" and len(parts) == 4:
+                objects[name] = apply_merge_patch(objects[name], body)
+                if kind == "deployments":
+                    store.sync_pods(namespace, objects[name])
+                return objects[name]
+            if method == "PATCH":
+                objects[name]["spec"].update(body)
+                if kind == "deployments":
+                    store.sync_pods(namespace, objects[name])
+                return objects[name]
+            if method == "PUT":
+                body["metadata"]["namespace"] = namespace
+                body["metadata"]["creationTimestamp"] = objects[name]["metadata"]["creationTimestamp"]
+                if kind == "deployments":
+                    store.init_deployment(body)
+                objects[name] = body
+                if kind == "deployments":
+                    store.sync_pods(namespace, body)
+                return body
+        return {"status": "Success"}
+
+
+def create_request_handler(stub):
+    class RequestHandler(BaseHTTPRequestHandler):
+        # keep-alive, like the real api
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def answer(self, code, data):
+            out = json.dumps(data).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def handle_method(self, method):
+            path, _, query = self.path.partition("?")
+            if path.endswith("/log"):
+                return self.stream_log(path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = None
+            if length:
+                raw = self.rfile.read(length)
+                if self.headers.get("Content-Encoding") == "gzip":
+                    raw = zlib.decompress(raw, 16 + zlib.MAX_WBITS)
+                body = json.loads(raw.decode('utf-8'))
+            command_id = str(uuid.uuid4())
+            try:
+                data = stub.handle(method, path, query, body)
+                if method != "GET":
+                    stub.store.record_changes()
+                results = data if isinstance(data, list) else [data]
+                message = {"id": command_id, "results": [{"data": d} for d in results]}
+            except Expired as e:
+                message = {"id": command_id, "status": "Failure", "code": 410, "error": str(e)}
+            except KeyError as e:
+                message = {"id": command_id, "status": "Failure", "error": "not found: {}".format(e)}
+            except (ValueError, TypeError) as e:
+                message = {"id": command_id, "status": "Failure", "error": str(e)}
+            threading.Thread(target=stub.push, args=(self.headers.get("Channel"), message), daemon=True).start()
+            self.answer(200, {"id": command_id})
+
+        def stream_log(self, path):
+            pod = path.strip("/").split("/")[3]
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for number in range(10):
+                line = "{} {} log line {}\n".format(now(), pod, number).encode('utf-8')
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_GET(self):
+            self.handle_method("GET")
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            self.handle_method("POST")
+
+        def do_PUT(self):
+            self.handle_method("PUT")
+
+        def do_PATCH(self):
+            self.handle_method("PATCH")
+
+        def do_DELETE(self):
+            self.handle_method("DELETE")
+
+    return RequestHandler
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Containerum api and tcp channel")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--api-port', type=int, default=3333)
+    parser.add_argument('--tcp-port', type=int, default=3000)
+    parser.add_argument('--framing', nargs='*', default=get_framings(), help='framings the server accepts')
+    parser.add_argument('--no-compression', action='store_true', default=False)
+    parser.add_argument('--history', type=int, default=HISTORY_SIZE, help='changes kept for delta lists')
+    args = parser.parse_args()
+
+    stub = StubServer(args.framing, not args.no_compression, args.history)
+    threading.Thread(target=stub.serve_tcp, args=(args.host, args.tcp_port), daemon=True).start()
+    print("api: http://{}:{}  tcp: {}:{}  framing: {}".format(
+        args.host, args.api_port, args.host, args.tcp_port, ", ".join(args.framing)))
+    try:
+        ThreadingHTTPServer((args.host, args.api_port), create_request_handler(stub)).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import re
+import time
+from collections import defaultdict
+from completion_index import KIND_ALIASES
+
+CONDITION_REGEX = re.compile(r"^(?:(?P<available>available)|condition=(?P<condition>[\w.-]+)|"
+                             r"replicas=(?P<replicas>\d+)|(?P<deleted>delete|deleted))$")
+
+TARGET_ERROR = "Target must be KIND/NAME, for example deploy/web"
+CONDITION_ERROR = "Condition must be available, condition=TYPE, replicas=N or delete"
+WAIT_TIMEOUT_ERROR = "timed out waiting for {}"
+NOT_FOUND_ERROR = "{} not found"
+
+EXIT_OK = 0
+EXIT_TIMEOUT = 1
+EXIT_ERROR = 2
+
+DEFAULT_TIMEOUT = 300
+MIN_INTERVAL = 0.2
+MAX_INTERVAL = 2
+
+
+def parse_target(target):
+    """
+    Returns (kind, name) for KIND/NAME, kind aliases like deploy or po are accepted
+    """
+    kind, _, name = target.partition("/")
+    kind = KIND_ALIASES.get(kind.lower())
+    if not name or kind not in ("deployments", "pods", "services"):
+        raise ValueError(TARGET_ERROR)
+    return kind, name
+
+
+def parse_condition(condition):
+    """
+    Returns check(item) -> bool, item is a decoded api object or None when it does not exist
+    """
+    match = CONDITION_REGEX.match(str(condition).strip())
+    if not match:
+        raise ValueError(CONDITION_ERROR)
+    if match.group("deleted"):
+        return lambda item: item is None
+    if match.group("available"):
+        return is_available
+    if match.group("condition"):
+        return lambda item: has_condition(item, match.group("condition"))
+    replicas = int(match.group("replicas"))
+    return lambda item: item is not None and get_status(item).get("availableReplicas", 0) == replicas \
+        and (item.get("spec") or {}).get("replicas") == replicas
+
+
+def get_status(item):
+    return item.get("status") or {}
+
+
+def has_condition(item, condition_type):
+    if item is None:
+        return False
+    for condition in get_status(item).get("conditions") or []:
+        if condition.get("type", "").lower() == condition_type.lower():
+            return condition.get("status") == "True"
+    return False
+
+
+def is_available(item):
+    """
+    Deployments are available when every desired replica is updated and available,
+    pods when they are Ready, services as soon as they exist
+    """
+    if item is None:
+        return False
+    spec = item.get("spec") or {}
+    if "containers" in spec:
+        return has_condition(item, "Ready")
+    if "template" not in spec:
+        return True
+    replicas = spec.get("replicas", 1)
+    status = get_status(item)
+    return status.get("updatedReplicas", 0) >= replicas and status.get("availableReplicas", 0) >= replicas
+
+
+def wait_for(list_kind, targets, check, timeout=DEFAULT_TIMEOUT, fan_out=map):
+    """
+    Waits until check holds for every (kind, name) target, every round lists each kind once
+    however many objects wait on it. list_kind(kind) returns decoded items or {'error': ...}.
+    Returns (exit code, {target: error}) for targets that failed or timed out
+    """
+    pending = defaultdict(set)
+    for kind, name in targets:
+        pending[kind].add(name)
+    deadline = time.monotonic() + timeout
+    interval = MIN_INTERVAL
+    errors = {}
+    seen = set()
+    while pending:
+        kinds = list(pending)
+        for kind, items in zip(kinds, fan_out(list_kind, kinds)):
+            if isinstance(items, dict):
+                for name in pending.pop(kind):
+                    errors[(kind, name)] = items.get("error")
+                continue
+            by_name = {i.get("metadata", {}).get("name"): i for i in items}
+            for name in list(pending[kind]):
+                if name in by_name:
+                    seen.add((kind, name))
+                if check(by_name.get(name)):
+                    pending[kind].discard(name)
+            if not pending[kind]:
+                pending.pop(kind)
+        if not pending:
+            break
+        now = time.monotonic()
+        if now >= deadline:
+            code = EXIT_ERROR if errors else EXIT_TIMEOUT
+            for kind, names in pending.items():
+                for name in names:
+                    error = WAIT_TIMEOUT_ERROR if (kind, name) in seen else NOT_FOUND_ERROR
+                    errors[(kind, name)] = error.format('{}/{}'.format(kind, name))
+            return code, errors
+        # the last sleep ends at the deadline, so targets get one more check then
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 2, MAX_INTERVAL)
+    return (EXIT_ERROR if errors else EXIT_OK), errors